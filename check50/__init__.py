@@ -30,7 +30,7 @@ from ._api import (
     exists,
     hash,
     include,
-    run,
+    run, run_async, run_many,
     log, _log,
     hidden,
     Failure, Mismatch, Missing
@@ -42,4 +42,4 @@ from .runner import check
 from pexpect import EOF
 
 __all__ = ["import_checks", "data", "exists", "hash", "include", "regex",
-           "run", "log", "Failure", "Mismatch", "Missing", "check", "EOF"]
+           "run", "run_async", "run_many", "log", "Failure", "Mismatch", "Missing", "check", "EOF"]
@@ -5,6 +5,7 @@ import gettext
 import importlib
 import inspect
 import itertools
+import json
 from json import JSONDecodeError
 import logging
 import os
@@ -17,13 +18,14 @@ import subprocess
 import sys
 import tempfile
 import time
+import traceback
 
 import attr
 import lib50
 import requests
 import termcolor
 
-from . import _exceptions, internal, renderer, __version__
+from . import _cache, _exceptions, _timings, _transcripts, internal, renderer, __version__
 from .contextmanagers import nullcontext
 from .runner import CheckRunner
 
@@ -225,6 +227,18 @@ def process_args(args):
         if not args.log_level:
             args.log_level = "info"
 
+    # batch implies local
+    if args.batch:
+        args.local = True
+
+    # record implies local and no cache, such that every check runs
+    if args.record:
+        if args.batch:
+            raise _exceptions.Error(_("--record can't be used together with --batch"))
+        args.local = True
+        args.no_cache = True
+        args.record = Path(args.record).expanduser().resolve()
+
     # offline implies local
     if args.offline:
         args.no_install_dependencies = True
@@ -244,6 +258,8 @@ def process_args(args):
             useless_args.append("--no-downloads-checks")
         if args.no_install_dependencies:
             useless_args.append("--no-install-dependencies")
+        if args.no_cache:
+            useless_args.append("--no-cache")
 
         if useless_args:
             LOGGER.warning(_("You should always use --local when using: {}").format(", ".join(useless_args)))
@@ -258,6 +274,12 @@ def process_args(args):
 
     args.output = seen_output
 
+    if args.batch and "html" in args.output:
+        LOGGER.warning(_("html output is not supported when checking a batch of submissions"))
+        args.output.remove("html")
+        if not args.output:
+            args.output.append("ansi")
+
     if args.ansi_log and "ansi" not in seen_output:
         LOGGER.warning(_("--ansi-log has no effect when ansi is not among the output formats"))
 
@@ -293,8 +315,14 @@ def main():
                         action="store",
                         nargs="+",
                         default=["ansi", "html"],
-                        choices=["ansi", "json", "html"],
+                        choices=["ansi", "json", "ndjson", "html"],
                         help=_("format of check results"))
+    parser.add_argument("--batch",
+                        action="store",
+                        nargs="+",
+                        metavar="SUBMISSION",
+                        help=_("check each of these submissions (directories or archives) instead of the current directory,\n"
+                               "outputting one result document per submission (implies --local)"))
     parser.add_argument("--target",
                         action="store",
                         nargs="+",
@@ -316,6 +344,14 @@ def main():
     parser.add_argument("--no-download-checks",
                         action="store_true",
                         help=_("do not download checks, but use previously downloaded checks instead (only works with --local)"))
+    parser.add_argument("--no-cache",
+                        action="store_true",
+                        help=_("run every check, rather than reusing the results of checks whose inputs did not change (only works with --local)"))
+    parser.add_argument("--record",
+                        metavar="FILE",
+                        help=_("record the input, output and exit code of every program the checks run, and store these\n"
+                               "transcripts in FILE, for checks to replay against other submissions once FILE is in the checks\n"
+                               "directory as transcripts.json. meant to be run against a reference solution (implies --local and --no-cache)"))
     parser.add_argument("--no-install-dependencies",
                         action="store_true",
                         help=_("do not install dependencies (only works with --local)"))
@@ -332,94 +368,181 @@ def main():
     process_args(args)
 
     # Set excepthook
-    _exceptions.ExceptHook.initialize(args.output, args.output_file)
+    _exceptions.ExceptHook.initialize(args.output, args.output_file, batch=bool(args.batch))
 
-    # If remote, push files to GitHub and await results
-    if not args.local:
-        commit_hash = lib50.push("check50", internal.slug, internal.CONFIG_LOADER, data={"check50": True})[1]
-        with lib50.ProgressBar("Waiting for results") if "ansi" in args.output else nullcontext():
-            tag_hash, results = await_results(commit_hash, internal.slug)
-
-    # Otherwise run checks locally
-    else:
-        with lib50.ProgressBar("Checking") if "ansi" in args.output else nullcontext():
-            # If developing, assume slug is a path to check_dir
-            if args.dev:
-                internal.check_dir = Path(internal.slug).expanduser().resolve()
-                if not internal.check_dir.is_dir():
-                    raise _exceptions.Error(_("{} is not a directory").format(internal.check_dir))
-            # Otherwise have lib50 create a local copy of slug
-            else:
-                try:
-                    internal.check_dir = lib50.local(internal.slug, offline=args.no_download_checks)
-                except lib50.ConnectionError:
-                    raise _exceptions.Error(_("check50 could not retrieve checks from GitHub. Try running check50 again with --offline.").format(internal.slug))
-                except lib50.InvalidSlugError:
-                    raise_invalid_slug(internal.slug, offline=args.no_download_checks)
+    # Open the output up front, such that results can be streamed to it while checks run
+    file_manager = open(args.output_file, "w") if args.output_file else nullcontext(sys.stdout)
+    with file_manager as output_file:
+        # If remote, push files to GitHub and await results
+        if not args.local:
+            commit_hash = lib50.push("check50", internal.slug, internal.CONFIG_LOADER, data={"check50": True})[1]
+            with lib50.ProgressBar("Waiting for results") if "ansi" in args.output else nullcontext():
+                tag_hash, results = await_results(commit_hash, internal.slug)
+
+        # Otherwise run checks locally
+        else:
+            tag_hash = None
+            results = check_locally(args, output_file)
 
-            # Load config
-            config = internal.load_config(internal.check_dir)
+        render(results, args, output_file, tag_hash=tag_hash)
 
-            # Compile local checks if necessary
-            if isinstance(config["checks"], dict):
-                config["checks"] = internal.compile_checks(config["checks"], prompt=args.dev)
+    sys.exit(should_fail(results))
 
-            install_translations(config["translations"])
 
-            if not args.no_install_dependencies:
-                install_dependencies(config["dependencies"])
+def check_locally(args, output_file):
+    """Run the checks locally, streaming results to output_file where requested. Returns the results."""
+    with lib50.ProgressBar("Checking") if "ansi" in args.output and not args.batch else nullcontext():
+        # If developing, assume slug is a path to check_dir
+        if args.dev:
+            internal.check_dir = Path(internal.slug).expanduser().resolve()
+            if not internal.check_dir.is_dir():
+                raise _exceptions.Error(_("{} is not a directory").format(internal.check_dir))
+        # Otherwise have lib50 create a local copy of slug
+        else:
+            try:
+                internal.check_dir = lib50.local(internal.slug, offline=args.no_download_checks)
+            except lib50.ConnectionError:
+                raise _exceptions.Error(_("check50 could not retrieve checks from GitHub. Try running check50 again with --offline.").format(internal.slug))
+            except lib50.InvalidSlugError:
+                raise_invalid_slug(internal.slug, offline=args.no_download_checks)
 
-            checks_file = (internal.check_dir / config["checks"]).resolve()
+        # Load config
+        config = internal.load_config(internal.check_dir)
 
-            # Have lib50 decide which files to include
-            included_files = lib50.files(config.get("files"))[0]
+        # Compile local checks if necessary
+        if isinstance(config["checks"], dict):
+            config["checks"] = internal.compile_checks(config["checks"], prompt=args.dev)
 
-            # Create a working_area (temp dir) named - with all included student files
-            with CheckRunner(checks_file, included_files) as check_runner, \
-                    contextlib.redirect_stdout(LoggerWriter(LOGGER, logging.NOTSET)), \
-                    contextlib.redirect_stderr(LoggerWriter(LOGGER, logging.NOTSET)):
+        install_translations(config["translations"])
 
-                check_results = check_runner.run(args.target)
-                results = {
-                    "slug": internal.slug,
-                    "results": [attr.asdict(result) for result in check_results],
-                    "version": __version__
-                }
+        internal.limits = config["limits"]
+        internal.recording = bool(args.record)
+
+        if not args.no_install_dependencies:
+            install_dependencies(config["dependencies"])
+
+        checks_file = (internal.check_dir / config["checks"]).resolve()
+
+        # Remember how long each check takes, for scheduling and predictions
+        timings = _timings.Timings(internal.slug, internal.check_dir)
+
+        # Reuse the results of checks whose inputs did not change
+        cache = None if args.no_cache else _cache.ResultCache(internal.check_dir)
+
+        # Check each submission of the batch against the same checks, then exit
+        if args.batch:
+            check_runner = CheckRunner(checks_file, [], fresh_import=config["fresh_import"], timings=timings, cache=cache)
+            sys.exit(check_batch(check_runner, config.get("files"), args, output_file))
+
+        # Have lib50 decide which files to include
+        included_files = lib50.files(config.get("files"))[0]
 
+        # Create a working_area (temp dir) named - with all included student files
+        with CheckRunner(checks_file, included_files, fresh_import=config["fresh_import"], timings=timings, cache=cache) as check_runner, \
+                contextlib.redirect_stdout(LoggerWriter(LOGGER, logging.NOTSET)), \
+                contextlib.redirect_stderr(LoggerWriter(LOGGER, logging.NOTSET)):
+
+            expected_duration = check_runner.expected_duration(args.target)
+            if expected_duration is not None:
+                LOGGER.info(_("checks are expected to take about {:.1f} seconds").format(expected_duration))
+
+            # Stream each result as soon as it is in
+            def stream(result):
+                output_file.write(json.dumps(attr.asdict(result)) + "\n")
+                output_file.flush()
+
+            check_results = check_runner.run(args.target, on_result=stream if "ndjson" in args.output else None)
+
+            if args.record:
+                _transcripts.collect(internal.run_root_dir, args.record)
+                LOGGER.info(_("recorded transcripts in {}").format(args.record))
+            return {
+                "slug": internal.slug,
+                "results": [attr.asdict(result) for result in check_results],
+                "version": __version__
+            }
+
+
+def render(results, args, output_file, tag_hash=None):
+    """Render results in each of the output formats in args.output to output_file."""
     LOGGER.debug(results)
 
-    # Render output
-    file_manager = open(args.output_file, "w") if args.output_file else nullcontext(sys.stdout)
-    with file_manager as output_file:
-        for output in args.output:
-            if output == "json":
-                output_file.write(renderer.to_json(**results))
-                output_file.write("\n")
-            elif output == "ansi":
-                output_file.write(renderer.to_ansi(**results, _log=args.ansi_log))
-                output_file.write("\n")
-            elif output == "html":
-                if os.environ.get("CS50_IDE_TYPE") and args.local:
+    for output in args.output:
+        if output == "json":
+            output_file.write(renderer.to_json(**results))
+            output_file.write("\n")
+        elif output == "ndjson":
+            # Results of local checks have been streamed already as they came in
+            if args.local:
+                output_file.write(renderer.to_ndjson_summary(**results))
+            else:
+                output_file.write(renderer.to_ndjson(**results))
+            output_file.write("\n")
+        elif output == "ansi":
+            output_file.write(renderer.to_ansi(**results, _log=args.ansi_log))
+            output_file.write("\n")
+        elif output == "html":
+            if os.environ.get("CS50_IDE_TYPE") and args.local:
+                html = renderer.to_html(**results)
+                subprocess.check_call(["c9", "exec", "renderresults", "check50", html])
+            else:
+                if args.local:
                     html = renderer.to_html(**results)
-                    subprocess.check_call(["c9", "exec", "renderresults", "check50", html])
+                    with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".html") as html_file:
+                        html_file.write(html)
+
+                    if "microsoft-standard" in platform.uname().release:
+                        stream = os.popen(f"wslpath -m {html_file.name}")
+                        wsl_path = stream.read().strip()
+                        url = f"file://{wsl_path}"
+                    else:
+                        url = f"file://{html_file.name}"
                 else:
-                    if args.local:
-                        html = renderer.to_html(**results)
-                        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".html") as html_file:
-                            html_file.write(html)
-
-                        if "microsoft-standard" in platform.uname().release:
-                            stream = os.popen(f"wslpath -m {html_file.name}")
-                            wsl_path = stream.read().strip()
-                            url = f"file://{wsl_path}"
-                        else:
-                            url = f"file://{html_file.name}"
+                    url = f"https://submit.cs50.io/check50/{tag_hash}"
+
+                termcolor.cprint(_("To see more detailed results go to {}").format(url), "white", attrs=["bold"])
+
+
+def check_batch(check_runner, files, args, output_file):
+    """
+    Check each submission in args.batch, rendering one result document per submission to output_file
+    as soon as it has been checked. Returns whether any submission should fail.
+    """
+    failed = False
+
+    with contextlib.redirect_stdout(LoggerWriter(LOGGER, logging.NOTSET)), \
+            contextlib.redirect_stderr(LoggerWriter(LOGGER, logging.NOTSET)):
+
+        for submission, check_results in check_runner.run_batch(args.batch, files, args.target):
+            results = {"slug": internal.slug, "submission": submission, "version": __version__}
+            if isinstance(check_results, Exception):
+                results["error"] = {
+                    "type": type(check_results).__name__,
+                    "value": str(check_results),
+                    "traceback": traceback.format_exception(type(check_results), check_results, check_results.__traceback__),
+                    "data": check_results.payload if hasattr(check_results, "payload") else {}
+                }
+            else:
+                results["results"] = [attr.asdict(result) for result in check_results]
+
+            LOGGER.debug(results)
+            failed = should_fail(results) or failed
+
+            for output in args.output:
+                if output in ("json", "ndjson"):
+                    # One document per line
+                    output_file.write(json.dumps(results))
+                elif output == "ansi":
+                    output_file.write(termcolor.colored(submission, "white", attrs=["bold"]) + "\n")
+                    if "error" in results:
+                        output_file.write(termcolor.colored(f"    {results['error']['value']}", "red"))
                     else:
-                        url = f"https://submit.cs50.io/check50/{tag_hash}"
+                        output_file.write(renderer.to_ansi(results["slug"], results["results"], results["version"], _log=args.ansi_log))
+                output_file.write("\n")
+            output_file.flush()
 
-                    termcolor.cprint(_("To see more detailed results go to {}").format(url), "white", attrs=["bold"])
+    return failed
 
-    sys.exit(should_fail(results))
 
 def should_fail(results):
     return "error" in results or any(not result["passed"] for result in results["results"])
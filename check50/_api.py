@@ -1,18 +1,20 @@
+import asyncio
 import hashlib
 import functools
 import numbers
 import os
 import re
-import shlex
+import select
 import shutil
 import signal
 import sys
+import tempfile
 import time
 
 import pexpect
 from pexpect.exceptions import EOF, TIMEOUT
 
-from . import internal, regex
+from . import internal, regex, _limits, _pipes, _proc, _transcripts
 
 _log = []
 internal.register.before_every(_log.clear)
@@ -33,6 +35,21 @@ def log(line):
 _data = {}
 internal.register.before_every(_data.clear)
 
+# Peak resident set size (as reported by getrusage) of every process reaped by run during the current check
+_max_rss = []
+internal.register.before_every(_max_rss.clear)
+
+# Every process started by run during the current check
+_processes = []
+internal.register.before_every(_processes.clear)
+
+
+def _kill_processes():
+    """Kill every process started during the current check that is still running, along with its process group."""
+    for process in _processes:
+        if not process.process.closed:
+            process.kill()
+
 
 def data(**kwargs):
     """
@@ -131,6 +148,7 @@ def import_checks(path):
 
     """
     dir = internal.check_dir / path
+    internal.imported_dirs.add(dir.resolve())
     file = internal.load_config(dir)["checks"]
     mod = internal.import_file(dir.name, (dir / file).resolve())
     sys.modules[dir.name] = mod
@@ -144,8 +162,15 @@ class run:
 
     :param command: command to be run
     :param env: environment in which to run command
+    :param tty: whether to run the command in a pseudo-terminal, or with its \
+                stdin, stdout and stderr connected to plain pipes instead. \
+                Defaults to ``run.tty``, which is ``True`` unless changed.
+    :param limits: resource limits of the process, in addition to (and overriding) \
+                   those under ``limits`` in ``.cs50.yaml``, see below
     :type command: str
     :type env: dict
+    :type tty: bool
+    :type limits: dict
 
     By default, the command will be run using the same environment as ``check50``,
     these mappings may be overridden via the ``env`` parameter::
@@ -153,18 +178,103 @@ class run:
         check50.run("./foo").stdin("foo").stdout("bar").exit(0)
         check50.run("./foo", env={ "HOME": "/" }).stdin("foo").stdout("bar").exit(0)
 
+    Starting a process with pipes is faster than with a pseudo-terminal. But programs
+    typically buffer their output when it is not written to a terminal, so a prompt that does
+    not end with a newline may only arrive once the program exits. Only run programs without
+    a tty if a check does not depend on their prompts, or on anything else terminal specific::
+
+        check50.run("./foo", tty=False).stdin("foo", prompt=False).stdout("bar").exit(0)
+
+    To run all commands of a checks module without a tty, set ``check50.run.tty = False``.
+
+    Limits on the resources a process may use are applied (with ``setrlimit``) right before the command starts,
+    and so hold for every process the command starts in turn. Possible limits are ``cpu`` (seconds of CPU time),
+    ``memory`` (bytes of address space), ``file_size`` (bytes written to any one file), ``processes``
+    (number of processes of the user running check50, including those of other checks) and ``files``
+    (number of open files). Sizes can be given in K, M or G, e.g.::
+
+        check50.run("./foo", limits={"cpu": 2, "memory": "512M", "processes": 100}).exit(0)
+
+    A program that exceeds its limit of CPU time or file size is killed, and the check fails saying so. A program that
+    exceeds any other limit finds that allocating memory, starting processes or opening files fails instead.
+    Limits for all commands of a problem can be set in ``.cs50.yaml``::
+
+        check50:
+          limits:
+            cpu: 10
+            memory: 1G
     """
 
-    def __init__(self, command, env={}):
+    #: Whether commands run in a pseudo-terminal, unless specified otherwise per command
+    tty = True
+
+    #: Number of seconds without output after which a prompt is assumed to be complete,
+    #: unless the program is seen waiting for input before then (Linux only)
+    prompt_idle = .1
+
+    # Number of seconds between checks whether the program is waiting for input
+    _POLL_INTERVAL = .005
+
+    #: Maximum number of characters of output a program may produce, before check50 gives up on it
+    max_output = 16 * 1024 ** 2
+
+    #: Maximum number of characters of unmatched output to keep in memory, the rest is spooled to disk.
+    #: Also the size of the window within which output is matched
+    max_output_in_memory = 1024 ** 2
+
+    def __init__(self, command, env={}, tty=None, limits=None):
         log(_("running {}...").format(command))
 
         full_env = os.environ.copy()
         full_env.update(env)
 
-        # Workaround for OSX pexpect bug http://pexpect.readthedocs.io/en/stable/commonissues.html#truncated-output-just-before-child-exits
+        # Pin the backend of this process, in case the default changes later on
+        self.tty = type(self).tty if tty is None else tty
+
+        self.limits = {**internal.limits, **_limits.validate(limits or {})}
+
+        # Run simple commands (e.g. ./hello foo) directly, rather than have bash parse them first
+        argv = _simple_command(command, full_env.get("PATH"))
+        self.process = None
+        if argv:
+            try:
+                self.process = self._spawn(argv, full_env)
+            except (pexpect.ExceptionPexpect, OSError):
+                # E.g. a script without shebang, that only bash knows how to run
+                pass
+
+        # A shell reports a command it ran that was killed by signal n as having exited with 128 + n
+        self._shell = self.process is None
+        if self._shell:
+            self.process = self._spawn(["bash", "-c", command], full_env)
+
+        # Bound the output pexpect holds on to and searches through. Read output in large chunks,
+        # such that long outputs don't take as many searches, but no larger than what is searched at once
+        self.process.searchwindowsize = self.max_output_in_memory
+        self.process.maxread = min(65536, self.max_output_in_memory)
+        self.process.logfile_read = self._output = _OutputSpool(self.process, self.max_output_in_memory, self.max_output)
+
+        # What the program was last seen blocked in while waiting for input, since input was last sent
+        self._input_wait = None
+
+        # Record everything that goes in and out of the process, if check50 is recording transcripts (see check50 --record)
+        self._transcript = self._output.transcript = _transcripts.record(command, env, self.tty, self.limits)
+
+        # Either way the process starts in a session (and so a process group) of its own,
+        # such that it can be killed together with everything it starts
+        _processes.append(self)
+
+    def _spawn(self, argv, env):
+        """Start argv, in a pseudo-terminal if self.tty."""
+        # Apply the limits in the child process, right before it executes argv
+        preexec_fn = functools.partial(_limits.apply, self.limits) if self.limits else None
+
+        if not self.tty:
+            return _pipes.PipeSpawn(argv, env=env, preexec_fn=preexec_fn)
+
+        # Running commands via bash is a workaround for OSX pexpect bug http://pexpect.readthedocs.io/en/stable/commonissues.html#truncated-output-just-before-child-exits
         # Workaround from https://github.com/pexpect/pexpect/issues/373
-        command = "bash -c {}".format(shlex.quote(command))
-        self.process = pexpect.spawn(command, encoding="utf-8", echo=False, env=full_env)
+        return _PtySpawn(argv[0], args=argv[1:], encoding="utf-8", echo=False, env=env, preexec_fn=preexec_fn)
 
     def stdin(self, line, str_line=None, prompt=True, timeout=3):
         """
@@ -184,6 +294,9 @@ class run:
         :raises check50.Failure: if ``prompt`` is set to True and no prompt is given
 
         """
+        return _block(self._stdin(line, str_line, prompt, timeout))
+
+    def _stdin(self, line, str_line, prompt, timeout):
         if str_line is None:
             str_line = line
 
@@ -194,18 +307,23 @@ class run:
 
         if prompt:
             try:
-                self.process.expect(".+", timeout=timeout)
+                yield from self._expect(self.process.expect, ".+", timeout)
             except (TIMEOUT, EOF):
                 raise Failure(_("expected prompt for input, found none"))
             except UnicodeDecodeError:
                 raise Failure(_("output not valid ASCII text"))
 
             # Consume everything on the output buffer
-            try:
-                for _i in range(int(timeout * 10)):
-                    self.process.expect(".+", timeout=0.1)
-            except (TIMEOUT, EOF):
-                pass
+            waiting = yield from self._drain(timeout)
+        else:
+            waiting = False
+
+        # pexpect pauses before sending anything, to give a program time to set up its terminal.
+        # Needless if the program is waiting for input already. Pause here rather than in pexpect, so as not to block
+        delay = self.process.delaybeforesend
+        if delay and not waiting:
+            yield from _sleep(delay)
+        self.process.delaybeforesend = None
 
         try:
             if line == EOF:
@@ -214,8 +332,74 @@ class run:
                 self.process.sendline(line)
         except OSError:
             pass
+        finally:
+            self.process.delaybeforesend = delay
+            self._input_wait = None
+
+        if self._transcript:
+            self._transcript.input(None if line == EOF else line)
         return self
 
+    def _expect(self, expect, pattern, timeout):
+        """
+        Call expect(pattern) for at most timeout seconds. Gives up (raises TIMEOUT) early if the program
+        is waiting for input with no output left to match, as then no match can come anymore.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return expect(pattern, timeout=0)
+            except TIMEOUT:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise
+
+            if not (yield from self._idle(min(self._POLL_INTERVAL, remaining))) and self._waiting_for_input():
+                # Match any output the program wrote right before it started waiting
+                return expect(pattern, timeout=0)
+
+    def _waiting_for_input(self):
+        """
+        Whether the program is waiting for input. That is, whether all of it was seen blocked, reading
+        from stdin, in just the same way on the last two polls since input was last sent (see _proc).
+        """
+        wait = _proc.waiting_for_input(self.process.pid)
+        stable = wait is not None and wait == self._input_wait
+        self._input_wait = wait
+        return stable
+
+    def _drain(self, timeout):
+        """
+        Consume all output until the program waits for input, goes quiet for prompt_idle seconds,
+        or exits, but for at most timeout seconds. Returns whether the program was seen waiting for input.
+        """
+        now = time.monotonic()
+        deadline = now + timeout
+        quiet_since = now
+
+        try:
+            while now < deadline:
+                try:
+                    self.process.expect(".+", timeout=0)
+                    quiet_since = time.monotonic()
+                except TIMEOUT:
+                    if not (yield from self._idle(min(self._POLL_INTERVAL, deadline - now))):
+                        if self._waiting_for_input():
+                            break
+                        if time.monotonic() - quiet_since >= self.prompt_idle:
+                            return False
+                now = time.monotonic()
+            else:
+                return False
+
+            # Consume what the program output right before it started waiting
+            while True:
+                self.process.expect(".+", timeout=0)
+        except TIMEOUT:
+            return True
+        except EOF:
+            return False
+
     def stdout(self, output=None, str_output=None, regex=True, timeout=3, show_timeout=False):
         """
         Retrieve all output from stdout until timeout (3 sec by default). If ``output``
@@ -250,9 +434,13 @@ class run:
             if not re.match("[Hh]ello, world!?", output):
                 raise check50.Mismatch("hello, world", output)
         """
+        return _block(self._stdout(output, str_output, regex, timeout, show_timeout))
+
+    def _stdout(self, output, str_output, regex, timeout, show_timeout):
         if output is None:
-            self._wait(timeout)
-            return self.process.before.replace("\r\n", "\n").lstrip("\n")
+            unmatched = self.process._before
+            yield from self._wait(timeout)
+            return (self._output.spooled(unmatched) + self.process.before).replace("\r\n", "\n").lstrip("\n")
 
         # In case output is a stream (file-like object), read from it
         try:
@@ -273,11 +461,19 @@ class run:
         if output == EOF:
             log(_("checking for EOF..."))
         else:
-            output = str(output).replace("\n", "\r\n")
+            # A terminal translates each newline to \r\n, pipes leave output untouched
+            if self.tty:
+                output = str(output).replace("\n", "\r\n")
+            else:
+                output = str(output)
             log(_("checking for output \"{}\"...").format(str_output))
 
+            # Hand pexpect a compiled pattern (compiled like pexpect would), rather than have it compile the same pattern anew
+            if regex:
+                output = _compile(output)
+
         try:
-            expect(output, timeout=timeout)
+            yield from self._expect(expect, output, timeout)
         except EOF:
             result = self.process.before + self.process.buffer
             if self.process.after != EOF:
@@ -290,6 +486,9 @@ class run:
             raise Missing(str_output, self.process.before)
         except UnicodeDecodeError:
             raise Failure(_("output not valid ASCII text"))
+        except Failure:
+            # E.g. the check timing out
+            raise
         except Exception:
             raise Failure(_("check50 could not verify output"))
 
@@ -299,18 +498,152 @@ class run:
 
         return self
 
+    def stdout_all(self, outputs, str_outputs=None, regex=True, timeout=3):
+        """
+        Check that every output in ``outputs`` appears in stdout (in any order) within timeout
+        (3 sec by default). All outputs are looked for in a single pass over the output of the process,
+        which is faster than calling :meth:`check50.run.stdout` for each. Afterwards, all output up to
+        and including the last of these outputs is consumed.
+
+        :param outputs: outputs to be expected from stdout, each of which is treated like the \
+                        ``output`` argument of :meth:`check50.run.stdout`
+        :type outputs: list of str, int, float, stream
+        :param str_outputs: what will be displayed as expected outputs, a human \
+                            readable form of ``outputs``
+        :type str_outputs: list of str
+        :param regex: flag indicating whether ``outputs`` should be treated as regexes
+        :type regex: bool
+        :param timeout: maximum number of seconds to wait for ``outputs``
+        :type timeout: int / float
+        :raises check50.Missing: if any of ``outputs`` is not found, listing all that are missing
+        :raises check50.Failure: if the process outputs invalid UTF-8 text.
+
+        Example usage::
+
+            check50.run("./primes 10").stdout_all([2, 3, 5, 7]).exit(0)
+
+        """
+        return _block(self._stdout_many(outputs, str_outputs, regex, timeout, require_all=True))
+
+    def stdout_any(self, outputs, str_outputs=None, regex=True, timeout=3):
+        """
+        Check that any output in ``outputs`` appears in stdout within timeout (3 sec by default).
+        Afterwards, all output up to and including the first of these outputs is consumed.
+        Takes the same arguments as :meth:`check50.run.stdout_all`.
+
+        :raises check50.Missing: if none of ``outputs`` is found
+        :raises check50.Failure: if the process outputs invalid UTF-8 text.
+
+        Example usage::
+
+            check50.run("./coin").stdout_any(["heads", "tails"], regex=False).exit(0)
+
+        """
+        return _block(self._stdout_many(outputs, str_outputs, regex, timeout, require_all=False))
+
+    def _stdout_many(self, outputs, str_outputs, regex, timeout, require_all):
+        """Look for all (or any) of outputs in stdout in one pass, see stdout_all and stdout_any."""
+        # In case an output is a stream (file-like object), read from it
+        outputs = [output.read() if hasattr(output, "read") else output for output in outputs]
+        if str_outputs is None:
+            str_outputs = [str(output) for output in outputs]
+        patterns = [self._pattern(output, regex) for output in outputs]
+
+        log(_("checking for output {}...").format(", ".join(f"\"{str_output}\"" for str_output in str_outputs)))
+
+        # Offset of output (the output read so far, or at least its tail) within all output
+        output = self.process.buffer
+        offset = 0
+
+        # Absolute (start, end) of the first match of each pattern found so far
+        found = {}
+        searched = 0
+        lookback = self.max_output_in_memory
+
+        deadline = time.monotonic() + timeout
+        done = False
+        while True:
+            for i, pattern in enumerate(patterns):
+                if i not in found:
+                    match = pattern.search(output, max(0, searched - offset - lookback))
+                    if match:
+                        found[i] = (offset + match.start(), offset + match.end())
+            searched = offset + len(output)
+
+            if done or len(found) == len(patterns) or (found and not require_all):
+                break
+
+            # Keep no more output in memory than is searched
+            if len(output) > 2 * lookback:
+                offset += len(output) - lookback
+                output = output[-lookback:]
+
+            try:
+                output += self.process.read_nonblocking(self.process.maxread, timeout=0)
+            except TIMEOUT:
+                # Search just once more if the program can't output anything anymore (or time's up)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (not (yield from self._idle(min(self._POLL_INTERVAL, remaining)))
+                                      and self._waiting_for_input()):
+                    try:
+                        output += self.process.read_nonblocking(self.process.maxread, timeout=0)
+                    except (TIMEOUT, EOF):
+                        pass
+                    done = True
+            except EOF:
+                done = True
+            except UnicodeDecodeError:
+                raise Failure(_("output not valid ASCII text"))
+
+        if require_all and len(found) < len(patterns) or not found:
+            self._consume(output, 0)
+            missing = [str_output for i, str_output in enumerate(str_outputs) if i not in found]
+            raise Missing(", ".join(missing), output.replace("\r\n", "\n"))
+
+        # Consume everything up to the end of the last match (all), or of the first match (any)
+        end = max(found.values())[1] if require_all else min(found.values())[1]
+        self._consume(output, max(0, end - offset))
+        return self
+
+    def _consume(self, output, end):
+        """Consume output (that was read outside of pexpect) up to end, leaving the rest to be matched."""
+        process = self.process
+        process.before = output[:end]
+        process.buffer = output[end:]
+        process._before = process.buffer_type()
+        process._before.write(output[end:])
+
+    def _pattern(self, output, regex):
+        """Compiled regular expression that matches output in the output of the process."""
+        # In case output is an int/float, use a regex to match exactly that int/float
+        if isinstance(output, numbers.Number):
+            return _compile(globals()["regex"].decimal(output))
+
+        output = str(output)
+        if not regex:
+            output = re.escape(output)
+
+        # A terminal translates each newline to \r\n, pipes leave output untouched
+        if self.tty:
+            output = output.replace("\n", "\r\n")
+        return _compile(output)
+
     def reject(self, timeout=1):
         """
         Check that the process survives for timeout. Useful for checking whether program is waiting on input.
+        Where check50 can tell that the process is waiting for input (on Linux), this returns as soon as it is.
 
         :param timeout: number of seconds to wait
         :type timeout: int / float
         :raises check50.Failure: if process ends before ``timeout``
 
         """
+        return _block(self._reject(timeout))
+
+    def _reject(self, timeout):
         log(_("checking that input was rejected..."))
         try:
-            self._wait(timeout)
+            yield from self._wait(timeout)
         except Failure as e:
             if not isinstance(e.__cause__, TIMEOUT):
                 raise
@@ -342,7 +675,10 @@ class run:
 
 
         """
-        self._wait(timeout)
+        return _block(self._exit(code, timeout))
+
+    def _exit(self, code, timeout):
+        yield from self._wait(timeout)
 
         if code is None:
             return self.exitcode
@@ -353,29 +689,461 @@ class run:
         return self
 
     def kill(self):
-        """Kill the process.
+        """Kill the process, and any processes it started that are still running.
+
+        Sends a ``SIGKILL`` to the process's entire process group."""
+        self._kill_group()
+
+        # pexpect gives a process some time to exit after closing its terminal, needless if it was reaped already
+        if self.tty and self._reaped:
+            self.process.ptyproc.delayafterclose = 0
 
-        Child will first be sent a ``SIGHUP``, followed by a ``SIGINT`` and
-        finally a ``SIGKILL`` if it ignores the first two."""
         self.process.close(force=True)
         return self
 
+    def _kill_group(self):
+        """Send ``SIGKILL`` to every process in the process group of the process."""
+        pgid = self.process.pid
+
+        # Once the process is reaped, its pid may be reused by another process. That can only
+        # happen once the group is gone though, as a group's id stays reserved while it has members
+        if self._reaped:
+            try:
+                os.kill(pgid, 0)
+                return
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                return
+
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
     def _wait(self, timeout=5):
+        deadline = time.monotonic() + timeout
         try:
-            self.process.expect(EOF, timeout=timeout)
+            yield from self._expect(self.process.expect, EOF, timeout)
         except TIMEOUT:
             raise Failure(_("timed out while waiting for program to exit")) from TIMEOUT(timeout)
         except UnicodeDecodeError:
             raise Failure(_("output not valid ASCII text"))
 
+        # A program may close its output well before it exits
+        if not (yield from self._reap(deadline)):
+            raise Failure(_("timed out while waiting for program to exit")) from TIMEOUT(timeout)
         self.kill()
 
-        if self.process.signalstatus == signal.SIGSEGV:
-            raise Failure(_("failed to execute program due to segmentation fault"))
+        signalstatus = self.process.signalstatus
+        if signalstatus == signal.SIGSEGV:
+            help = None
+            if "memory" in self.limits:
+                help = _("the program could use at most {} bytes of memory").format(self.limits["memory"])
+            raise Failure(_("failed to execute program due to segmentation fault"), help=help)
+
+        # Unlike a program run directly, that may well exit with 128 + n itself
+        exitstatus = self.process.exitstatus
+        if self._shell and signalstatus is None and exitstatus is not None and exitstatus > 128:
+            signalstatus = exitstatus - 128
+
+        # Past its soft CPU limit a process gets SIGXCPU, past its hard limit SIGKILL
+        if "cpu" in self.limits and signalstatus in (signal.SIGXCPU, signal.SIGKILL):
+            raise Failure(_("program exceeded its limit of {} seconds of CPU time").format(self.limits["cpu"]),
+                          help=_("might your program be stuck in an infinite loop?"))
+
+        if "file_size" in self.limits and signalstatus == signal.SIGXFSZ:
+            raise Failure(_("program tried to write a file larger than its limit of {} bytes").format(self.limits["file_size"]))
 
         self.exitcode = self.process.exitstatus
+        if self._transcript:
+            self._transcript.exitcode = self.exitcode
         return self
 
+    def _reap(self, deadline):
+        """
+        Wait (see _block) for the process here rather than in pexpect, so as to learn how much memory
+        the process used. If the process has not exited by deadline, kill it (and its group) and reap it still.
+        Returns whether the process exited by itself.
+        """
+        if self._reaped:
+            return True
+
+        exited = True
+        while True:
+            try:
+                pid, status, rusage = os.wait4(self.process.pid, os.WNOHANG)
+            except ChildProcessError:
+                return True
+
+            if pid:
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._kill_group()
+                try:
+                    _pid, status, rusage = os.wait4(self.process.pid, 0)
+                except ChildProcessError:
+                    return False
+                exited = False
+                break
+
+            yield from _sleep(min(self._POLL_INTERVAL, remaining))
+
+        _max_rss.append(rusage.ru_maxrss)
+
+        # Let pexpect know the process is gone
+        if not self.tty:
+            self.process.set_status(status)
+            return exited
+
+        ptyproc = self.process.ptyproc
+        ptyproc.status = status
+        ptyproc.exitstatus = os.WEXITSTATUS(status) if os.WIFEXITED(status) else None
+        ptyproc.signalstatus = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+        ptyproc.terminated = True
+
+        # Have pexpect take the status over from ptyprocess
+        self.process.isalive()
+        return exited
+
+    @property
+    def _reaped(self):
+        """Whether the process has been waited for, after which its pid may be reused."""
+        return self.process.ptyproc.terminated if self.tty else self.process.reaped
+
+    def _idle(self, timeout):
+        """
+        Pause (see _block) until the process has output for us, but for at most timeout seconds.
+        Returns whether the process has output.
+        """
+        return (yield self.process.child_fd, timeout)
+
+
+def _sleep(seconds):
+    """Pause (see _block) for seconds."""
+    yield None, seconds
+
+
+def _block(steps):
+    """
+    Run steps, a generator of one of run's methods, to completion and return what it returns.
+    Wherever the steps have nothing to do for the moment, they yield a (fd, timeout) pair, upon which this
+    blocks until fd is readable, or until timeout seconds have passed (or just for timeout seconds if fd is None),
+    and then sends the steps whether fd is readable.
+    """
+    try:
+        fd, timeout = next(steps)
+        while True:
+            if fd is None:
+                time.sleep(timeout)
+                readable = False
+            else:
+                readable = bool(select.select([fd], [], [], timeout)[0])
+            fd, timeout = steps.send(readable)
+    except StopIteration as e:
+        return e.value
+
+
+
+class run_async(run):
+    """
+    Run a command, like :class:`check50.run`, but with coroutines in place of the methods
+    that wait for the process. While one process waits, others (in other tasks of the same
+    event loop) can run, such that a check can drive several processes concurrently::
+
+        async def client(n):
+            await check50.run_async(f"./client {n}").stdout("connected")
+
+        async def main():
+            server = check50.run_async("./server")
+            await server.stdout("listening")
+            await asyncio.gather(*(client(n) for n in range(10)))
+            await server.stdin("quit", prompt=False)
+            await server.exit(0)
+
+        asyncio.run(main())
+
+    Takes the same arguments as :class:`check50.run`.
+    """
+
+    async def stdin(self, line, str_line=None, prompt=True, timeout=3):
+        """Coroutine version of :meth:`check50.run.stdin`."""
+        return await _resume(self._stdin(line, str_line, prompt, timeout))
+
+    async def stdout(self, output=None, str_output=None, regex=True, timeout=3, show_timeout=False):
+        """Coroutine version of :meth:`check50.run.stdout`."""
+        return await _resume(self._stdout(output, str_output, regex, timeout, show_timeout))
+
+    async def stdout_all(self, outputs, str_outputs=None, regex=True, timeout=3):
+        """Coroutine version of :meth:`check50.run.stdout_all`."""
+        return await _resume(self._stdout_many(outputs, str_outputs, regex, timeout, require_all=True))
+
+    async def stdout_any(self, outputs, str_outputs=None, regex=True, timeout=3):
+        """Coroutine version of :meth:`check50.run.stdout_any`."""
+        return await _resume(self._stdout_many(outputs, str_outputs, regex, timeout, require_all=False))
+
+    async def reject(self, timeout=1):
+        """Coroutine version of :meth:`check50.run.reject`."""
+        return await _resume(self._reject(timeout))
+
+    async def exit(self, code=None, timeout=5):
+        """Coroutine version of :meth:`check50.run.exit`."""
+        return await _resume(self._exit(code, timeout))
+
+
+def run_many(command, cases, workers=None, regex=True, timeout=3, env={}, tty=None, limits=None):
+    """
+    Run command once for each of cases, several cases at a time, and check the output (and exit code) of each.
+    Unlike a check that calls :class:`check50.run` for each case, this checks every case rather than stopping at
+    the first that fails, and then fails with a summary of all cases that failed.
+
+    :param command: command to be run for each case
+    :type command: str
+    :param cases: cases to run, each an ``(input, output)`` or ``(input, output, code)`` tuple, where \
+                  ``input`` is a line (or list of lines) to be sent to stdin after a prompt (see \
+                  :meth:`check50.run.stdin`), ``output`` is the output to be expected from stdout \
+                  (see :meth:`check50.run.stdout`), and ``code`` the exit code to be expected, if any
+    :type cases: list of tuple
+    :param workers: maximum number of cases to run at once, by default a few more than there are CPUs
+    :type workers: int
+    :param regex: flag indicating whether the outputs should be treated as regexes
+    :type regex: bool
+    :param timeout: maximum number of seconds to wait for each prompt, output and exit
+    :type timeout: int / float
+    :param env: environment in which to run command, see :class:`check50.run`
+    :type env: dict
+    :param tty: whether to run command in a pseudo-terminal, see :class:`check50.run`
+    :type tty: bool
+    :param limits: resource limits of each process, see :class:`check50.run`
+    :type limits: dict
+    :raises check50.Failure: if any of the cases fails, listing those that failed
+
+    Example usage::
+
+        check50.run_many("./cash", [("0.41", "4\n", 0), ("0.01", "1\n", 0), ("1.6", "7\n", 0)])
+
+    """
+    cases = [case if isinstance(case, tuple) else tuple(case) for case in cases]
+    if workers is None:
+        # The same default as that of concurrent.futures.ThreadPoolExecutor, as processes spend much of their time waiting
+        workers = min(32, (os.cpu_count() or 1) + 4)
+
+    log(_("running {} cases of {}...").format(len(cases), command))
+
+    # The log of each run is of no use when interleaved with those of the others
+    log_length = len(_log)
+
+    async def run_case(semaphore, inputs, output, code=None):
+        async with semaphore:
+            process = run_async(command, env=env, tty=tty, limits=limits)
+            try:
+                for line in [inputs] if isinstance(inputs, str) else inputs:
+                    await process.stdin(line, timeout=timeout)
+                await process.stdout(output, regex=regex, timeout=timeout)
+                if code is not None:
+                    await process.exit(code, timeout=timeout)
+            except Failure as e:
+                return e
+            finally:
+                process.kill()
+
+    async def run_cases():
+        semaphore = asyncio.Semaphore(workers)
+        return await asyncio.gather(*(run_case(semaphore, *case) for case in cases))
+
+    results = asyncio.run(run_cases())
+    del _log[log_length:]
+
+    # Describe each case that failed by its input
+    failures = [(_raw(case[0] if isinstance(case[0], str) else " ".join(case[0])), failure)
+                for case, failure in zip(cases, results) if failure]
+    for inputs, failure in failures:
+        log(_("case {}: {}").format(inputs, failure))
+
+    if not failures:
+        log(_("all {} cases passed").format(len(cases)))
+        return
+
+    summary = "\n".join(_("case {}: {}").format(inputs, failure) for inputs, failure in failures[:_MAX_FAILED_CASES])
+    if len(failures) > _MAX_FAILED_CASES:
+        summary += "\n" + _("and {} more").format(len(failures) - _MAX_FAILED_CASES)
+
+    error = Failure(_("{} of {} cases failed").format(len(failures), len(cases)), help=summary)
+    error.payload["cases"] = [{"input": inputs, **failure.payload} for inputs, failure in failures]
+    raise error
+
+
+# Maximum number of failed cases summarized in the help of run_many's Failure
+_MAX_FAILED_CASES = 5
+
+
+async def _resume(steps):
+    """Like _block, but awaits rather than blocks wherever the steps pause, so that other tasks can run meanwhile."""
+    loop = asyncio.get_running_loop()
+    try:
+        fd, timeout = next(steps)
+        while True:
+            if fd is None:
+                await asyncio.sleep(timeout)
+                readable = False
+            else:
+                readable = await _readable(loop, fd, timeout)
+            fd, timeout = steps.send(readable)
+    except StopIteration as e:
+        return e.value
+
+
+async def _readable(loop, fd, timeout):
+    """Wait until fd is readable, but for at most timeout seconds. Returns whether fd is readable."""
+    ready = loop.create_future()
+
+    def wake(readable):
+        if not ready.done():
+            ready.set_result(readable)
+
+    loop.add_reader(fd, wake, True)
+    timer = loop.call_later(timeout, wake, False)
+    try:
+        return await ready
+    finally:
+        timer.cancel()
+        loop.remove_reader(fd)
+
+
+class _PtySpawn(pexpect.spawn):
+    """
+    A pexpect.spawn that never waits for its process once the process closes its terminal (upon which pexpect
+    would block until the process exits), as a process may live on long after. run._reap waits for it instead.
+    """
+    # A process closes its terminal a moment before it exits, give it as much time once
+    exit_grace = .1
+
+    def isalive(self):
+        # Without os.waitid (e.g. on macOS before Python 3.13), there's no peeking, only pexpect's own wait
+        if self.ptyproc.terminated or not self.flag_eof or not hasattr(os, "waitid"):
+            return super().isalive()
+
+        deadline = time.monotonic() + self.exit_grace
+        self.exit_grace = 0
+        while True:
+            # Peek whether the process exited, leaving it to be reaped
+            try:
+                if os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None:
+                    return False
+            except ChildProcessError:
+                return False
+
+            if time.monotonic() >= deadline:
+                return True
+            time.sleep(.001)
+
+
+class _OutputSpool:
+    """
+    Log of the output of a process (pexpect's logfile_read), that keeps the unmatched output pexpect
+    holds in memory (all output since the last match) within limit characters by moving the excess
+    to a temporary file. Raises a :class:`check50.Failure` once the process output more than
+    max_output characters altogether.
+    """
+
+    def __init__(self, process, limit, max_output):
+        self.process = process
+        self.limit = limit
+        self.max_output = max_output
+        self.size = 0
+        self._file = None
+        self._before = None
+        self.transcript = None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_output:
+            raise Failure(_("program produced too much output"),
+                          help=_("check50 stopped reading after {} characters of output, "
+                                 "might your program be stuck in an infinite loop?").format(self.max_output))
+
+        if self.transcript:
+            self.transcript.output(data)
+
+        # pexpect starts over with a new buffer of unmatched output after every match
+        before = self.process._before
+        if before is not self._before:
+            self._before = before
+            if self._file:
+                self._file.seek(0)
+                self._file.truncate()
+
+        if before.tell() > self.limit:
+            unmatched = before.getvalue()
+            excess = len(unmatched) - self.limit
+
+            if self._file is None:
+                self._file = tempfile.TemporaryFile("w+", encoding="utf-8", dir=internal.run_root_dir)
+            self._file.write(unmatched[:excess])
+
+            before.seek(0)
+            before.truncate()
+            before.write(unmatched[excess:])
+
+    def flush(self):
+        pass
+
+    def spooled(self, before):
+        """
+        The unmatched output that no longer fits in pexpect's buffer of unmatched output before,
+        and precedes what is in that buffer.
+        """
+        if not self._file or before is not self._before:
+            return ""
+        self._file.seek(0)
+        spooled = self._file.read()
+        self._file.seek(0, os.SEEK_END)
+        return spooled
+
+
+# Names that bash does not look up on PATH (its builtins and keywords), and so can't run without bash
+_BASH_BUILTINS = frozenset("""
+    . : [ alias bg bind break builtin caller cd command compgen complete compopt continue declare dirs disown
+    echo enable eval exec exit export false fc fg getopts hash help history jobs kill let local logout mapfile
+    popd printf pushd pwd read readarray readonly return set shift shopt source suspend test times trap true
+    type typeset ulimit umask unalias unset wait if then else elif fi case esac for select while until do done
+    in function time { } ! [[ ]] coproc
+""".split())
+
+# Any character that has a special meaning to bash, see shlex.quote
+_find_unsafe = re.compile(r"[^\w@%+=:,./-]", re.ASCII).search
+
+
+def _simple_command(command, path=None):
+    """
+    Return the argv of command if bash would run command as is, that is if command is just
+    a program and its arguments, without anything for bash to expand. Else return None.
+    Like bash, looks for the program on path, unless its name contains a slash.
+    """
+    # Keep bash on macOS, see run._spawn
+    if sys.platform == "darwin":
+        return None
+
+    argv = command.split()
+    if not argv or any(_find_unsafe(arg) for arg in argv):
+        return None
+
+    # Leave variable assignments (FOO=bar ./foo) and bash's own commands to bash
+    program = argv[0]
+    if "=" in program or program in _BASH_BUILTINS:
+        return None
+
+    if "/" not in program:
+        program = shutil.which(program, path=path)
+        if program is None:
+            return None
+    elif not (os.path.isfile(program) and os.access(program, os.X_OK)):
+        return None
+
+    return [program] + argv[1:]
+
 
 class Failure(Exception):
     """
@@ -511,6 +1279,12 @@ def _raw(s):
     return s
 
 
+@functools.lru_cache(maxsize=1024)
+def _compile(pattern):
+    """Compile regular expression pattern as pexpect would, reusing earlier compilations."""
+    return re.compile(pattern, re.DOTALL)
+
+
 def _copy(src, dst):
     """Copy src to dst, copying recursively if src is a directory."""
     try:
@@ -0,0 +1,233 @@
+"""
+Cache of the results of checks, such that checks whose inputs did not change need not run again
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import pickle
+import shutil
+import tempfile
+
+import attr
+import lib50
+
+from . import _timings, _workspace, internal, __version__
+from .runner import CheckResult
+
+#: Maximum size in bytes of all cached results (and their workspaces) combined
+MAX_SIZE = 1024 ** 3
+
+#: Maximum size in bytes of all cached compilations combined
+MAX_COMPILE_SIZE = 256 * 1024 ** 2
+
+# Estimated total size of the entries in each compile cache directory: the total left by the last eviction
+# in this process, plus the sizes of the entries this process stored since (but not those of other processes)
+_compile_totals = {}
+
+
+def hash_directory(directory):
+    """
+    Hash the relative paths and contents of all files in directory.
+
+    :param directory: directory to hash
+    :type directory: str / Path
+    :rtype: str
+    """
+    sha256 = hashlib.sha256()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            path = Path(root) / file
+            sha256.update(f"{path.relative_to(directory)}\0".encode())
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(65536), b""):
+                    sha256.update(block)
+            sha256.update(b"\0")
+    return sha256.hexdigest()
+
+
+class ResultCache:
+    """
+    Results of passed checks, together with the workspace (run_dir) each check left behind
+    and the state it returned, stored under ``results`` in check50's local path.
+
+    Each result is keyed by a hash of the check's name, the checks (including those they import with
+    :func:`check50.import_checks`, and check50's version and the fields of CheckResult),
+    and the key of its dependency. The key of a check without dependency derives from the
+    contents of the student's files instead. So a key changes whenever anything the check
+    (transitively) depends on changes.
+    """
+
+    def __init__(self, check_dir, max_size=MAX_SIZE):
+        self.path = lib50.get_local_path() / "results"
+        self.max_size = max_size
+        fields = (field.name for field in attr.fields(CheckResult))
+        self._base_key = self._hash(__version__, *fields, _timings.fingerprint(check_dir))
+        self._checks_keys = {}
+
+    def submission_key(self, submission_dir):
+        """Key for the student's files in submission_dir, to be used as the key of the dependency of root checks."""
+        return self._hash(self._checks_key(), hash_directory(submission_dir))
+
+    def key(self, check_name, dependency_key):
+        """Key of check check_name, whose dependency has key dependency_key."""
+        return self._hash(self._checks_key(), check_name, dependency_key)
+
+    def _checks_key(self):
+        """
+        Key of the checks, which covers the directories that they imported checks from as well.
+        Those are only known once the checks are imported, hence computed (once) on first use.
+        """
+        dirs = tuple(sorted(str(directory) for directory in internal.imported_dirs))
+        if dirs not in self._checks_keys:
+            self._checks_keys[dirs] = self._hash(self._base_key, *dirs, *map(_timings.fingerprint, dirs))
+        return self._checks_keys[dirs]
+
+    def load(self, key, run_dir):
+        """
+        Restore the cached workspace for key to run_dir and return the cached (CheckResult, state),
+        or return None if nothing is cached for key.
+        """
+        entry = self.path / key
+        try:
+            with open(entry / "result.pickle", "rb") as f:
+                result, state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+
+        try:
+            _workspace.clone_tree(entry / "workspace", run_dir)
+        except (OSError, shutil.Error):
+            # Another process evicted the entry meanwhile, leaving a partial workspace at most
+            shutil.rmtree(run_dir, ignore_errors=True)
+            return None
+
+        # Mark as recently used
+        os.utime(entry)
+        return result, state
+
+    def store(self, key, result, state, run_dir):
+        """Cache result, state and workspace run_dir under key. Silently gives up on anything that can't be cached."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry = Path(tempfile.mkdtemp(dir=self.path))
+        try:
+            with open(entry / "result.pickle", "wb") as f:
+                pickle.dump((result, state), f)
+            _workspace.clone_tree(run_dir, entry / "workspace")
+            _record_size(entry)
+            os.rename(entry, self.path / key)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def evict(self):
+        """Remove the least recently used results until all results fit in max_size."""
+        _evict(self.path, self.max_size)
+
+    @staticmethod
+    def _hash(*parts):
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+class CompileCache:
+    """
+    Executables built by :func:`check50.c.compile`, together with the output of the compiler, stored under
+    ``compile`` in check50's local path. Compilations that failed are cached too, with just the compiler's output
+    (and its rendering as text, where that output is JSON).
+
+    Each compilation is keyed by a hash of everything that determines its outcome: the compiler, the command,
+    and the names and contents of the files compiled (including the headers they include), see :meth:`key`.
+    """
+
+    def __init__(self, max_size=MAX_COMPILE_SIZE):
+        self.path = lib50.get_local_path() / "compile"
+        self.max_size = max_size
+
+    def key(self, parts, files):
+        """Key for a compilation determined by strings parts and by the names and contents of files."""
+        sha256 = hashlib.sha256(f"{__version__}\0".encode())
+        for part in parts:
+            sha256.update(f"{part}\0".encode())
+        for file in files:
+            sha256.update(f"{file}\0".encode())
+            with open(file, "rb") as f:
+                for block in iter(lambda: f.read(65536), b""):
+                    sha256.update(block)
+            sha256.update(b"\0")
+        return sha256.hexdigest()
+
+    def load(self, key, executable):
+        """
+        Restore the executable cached for key (if the compilation succeeded) to executable, and return the
+        compiler's (output, exitcode, rendering). Returns None if nothing is cached for key.
+        """
+        entry = self.path / key
+        try:
+            with open(entry / "result.json") as f:
+                result = json.load(f)
+            output, exitcode, rendering = result["output"], result["exitcode"], result.get("rendering")
+            if exitcode == 0:
+                _workspace.clone(entry / "executable", executable)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        # Mark as recently used
+        os.utime(entry)
+        return output, exitcode, rendering
+
+    def store(self, key, output, exitcode, executable=None, rendering=None):
+        """
+        Cache the compiler's output and exitcode, the executable it built (if any), and the compiler's rendering
+        of its diagnostics as text (if its output is JSON rather than text) under key, then evict the least recently used compilations once they may no longer fit. Silently gives up
+        on anything that can't be cached.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry = Path(tempfile.mkdtemp(dir=self.path))
+        size = 0
+        try:
+            with open(entry / "result.json", "w") as f:
+                json.dump({"output": output, "exitcode": exitcode, "rendering": rendering}, f)
+            if executable is not None:
+                _workspace.clone(executable, entry / "executable")
+            size = _record_size(entry)
+            os.rename(entry, self.path / key)
+        except OSError:
+            shutil.rmtree(entry, ignore_errors=True)
+
+        # Look at all entries only once in a while: upon the first store, and once the estimated total exceeds max_size
+        total = _compile_totals.get(self.path)
+        if total is None or total + size > self.max_size:
+            total = _evict(self.path, self.max_size)
+        else:
+            total += size
+        _compile_totals[self.path] = total
+
+
+def _record_size(entry):
+    """Write the total size of the files in cache entry (a directory) to the file size within it, and return it."""
+    size = sum(path.stat().st_size for path in entry.rglob("*") if path.is_file())
+    with open(entry / "size", "w") as f:
+        f.write(str(size))
+    return size
+
+
+def _evict(path, max_size):
+    """
+    Remove the least recently used entries in cache directory path until all entries fit in max_size.
+    Returns the total size of the entries left.
+    """
+    entries = []
+    for entry in path.glob("*/size"):
+        try:
+            entries.append((entry.parent.stat().st_mtime, int(entry.read_text()), entry.parent))
+        except (OSError, ValueError):
+            continue
+
+    total = sum(size for _mtime, size, _entry in entries)
+    for _mtime, size, entry in sorted(entries):
+        if total <= max_size:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+    return total
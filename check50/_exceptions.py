@@ -21,9 +21,10 @@ class RemoteCheckError(Error):
 
 
 class ExceptHook:
-    def __init__(self, outputs=("ansi",), output_file=None):
+    def __init__(self, outputs=("ansi",), output_file=None, batch=False):
         self.outputs = outputs
         self.output_file = output_file
+        self.batch = batch
 
     def __call__(self, cls, exc, tb):
         # If an error happened remotely, grab its traceback and message
@@ -50,9 +51,13 @@ class ExceptHook:
                 message = _("Sorry, something is wrong! check50 ran into an error, please try again.\n" \
                             "If the problem persists, please visit our status page https://cs50.statuspage.io for more information.")
 
-        # Output exception as json
-        if "json" in self.outputs:
-            ctxmanager = open(self.output_file, "w") if self.output_file else nullcontext(sys.stdout)
+        # Output exception as json (on a single line for ndjson, and in batch mode)
+        if "json" in self.outputs or "ndjson" in self.outputs:
+            # main has already streamed ndjson results, or a document per submission in batch mode, to output_file
+            # (and closed it), so append to those
+            streamed = "ndjson" in self.outputs or self.batch
+            mode = "a" if streamed else "w"
+            ctxmanager = open(self.output_file, mode) if self.output_file else nullcontext(sys.stdout)
             with ctxmanager as output_file:
                 json.dump({
                     "slug": internal.slug,
@@ -67,7 +72,7 @@ class ExceptHook:
                         "data" : exc.payload if hasattr(exc, "payload") else {}
                     },
                     "version": __version__
-                }, output_file, indent=4)
+                }, output_file, indent=None if streamed else 4)
                 output_file.write("\n")
 
         # Output exception to stderr
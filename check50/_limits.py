@@ -0,0 +1,70 @@
+"""
+Resource limits (rlimits) of the processes started by check50.run
+"""
+
+import re
+import resource
+import signal
+
+# Each limit that can be set, mapped to its rlimit
+_RESOURCES = {
+    # Seconds of CPU time
+    "cpu": resource.RLIMIT_CPU,
+    # Bytes of virtual memory (address space)
+    "memory": resource.RLIMIT_AS,
+    # Bytes that can be written to any one file
+    "file_size": resource.RLIMIT_FSIZE,
+    # Processes (and threads) of the user that runs check50, counted over all of their processes
+    "processes": resource.RLIMIT_NPROC,
+    # Open file descriptors per process
+    "files": resource.RLIMIT_NOFILE
+}
+
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def validate(limits):
+    """
+    Return limits with every value as a number, e.g. {"memory": "64M", "cpu": 1}
+    becomes {"memory": 67108864, "cpu": 1}. Values may have a suffix of K, M or G (powers of 1024).
+
+    :param limits: limits to validate
+    :type limits: dict
+    :rtype: dict
+    :raises ValueError: if any limit is unknown, or its value is not a non-negative number
+    """
+    if not isinstance(limits, dict):
+        raise ValueError(_("limits must be a mapping of limits to values"))
+
+    validated = {}
+    for name, value in limits.items():
+        if name not in _RESOURCES:
+            raise ValueError(_("unknown limit {}, expected one of {}").format(name, ", ".join(_RESOURCES)))
+
+        match = re.fullmatch(r"\s*(\d+)\s*([KMG]?)\s*", str(value)) if not isinstance(value, bool) else None
+        if not match:
+            raise ValueError(_("invalid value {} for limit {}").format(value, name))
+        validated[name] = int(match.group(1)) * _UNITS[match.group(2)]
+    return validated
+
+
+def apply(limits):
+    """
+    Set limits (as returned by validate) on this process. Meant to run in a child process before exec.
+    Limits never exceed the hard limits this process has already.
+    """
+    # Python (and so check50) ignores SIGXFSZ, which processes would otherwise inherit
+    if "file_size" in limits:
+        signal.signal(signal.SIGXFSZ, signal.SIG_DFL)
+
+    for name, value in limits.items():
+        rlimit = _RESOURCES[name]
+        _soft, hard = resource.getrlimit(rlimit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+
+        # Past its CPU limit a process gets SIGXCPU, and a second later SIGKILL should it ignore that
+        if rlimit == resource.RLIMIT_CPU and (hard == resource.RLIM_INFINITY or value < hard):
+            resource.setrlimit(rlimit, (value, value + 1))
+        else:
+            resource.setrlimit(rlimit, (value, value))
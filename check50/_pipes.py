@@ -0,0 +1,75 @@
+"""
+pexpect interface to processes that communicate through plain pipes rather than a pseudo-terminal
+"""
+
+import os
+import subprocess
+
+from pexpect.fdpexpect import fdspawn
+
+
+class PipeSpawn(fdspawn):
+    """
+    Start argv with its stdin, stdout and stderr connected to pipes, and interact with it
+    like with a :class:`pexpect.spawn`. Output is read from the combined stdout and stderr pipe,
+    input is written to the stdin pipe.
+
+    As with :class:`pexpect.spawn`, the process runs in a session (and so a process group) of its own.
+    """
+
+    def __init__(self, argv, env=None, encoding="utf-8", preexec_fn=None):
+        self.proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     env=env, start_new_session=True, preexec_fn=preexec_fn)
+        super().__init__(self.proc.stdout, encoding=encoding)
+        self.pid = self.proc.pid
+        self.exitstatus = None
+        self.signalstatus = None
+
+    @property
+    def reaped(self):
+        """Whether the process has been waited for, after which its pid may be reused."""
+        return self.proc.returncode is not None
+
+    def send(self, s):
+        """Write s to the process's stdin, return the number of bytes written."""
+        s = self._coerce_send_string(s)
+        self._log(s, "send")
+        if self.proc.stdin.closed:
+            raise BrokenPipeError("stdin of process is closed")
+        return os.write(self.proc.stdin.fileno(), self._encoder.encode(s, final=False))
+
+    def sendeof(self):
+        """Close the process's stdin."""
+        self.proc.stdin.close()
+
+    def set_status(self, status):
+        """Record wait status status (as returned by e.g. :func:`os.wait4`) of the process, once reaped elsewhere."""
+        self.proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        self.wait()
+
+    def wait(self):
+        """Wait for the process to exit, and return its exit code (or minus the signal that killed it)."""
+        returncode = self.proc.wait()
+        if returncode >= 0:
+            self.exitstatus, self.signalstatus = returncode, None
+        else:
+            self.exitstatus, self.signalstatus = None, -returncode
+        return returncode
+
+    def close(self, force=True):
+        """Close the pipes to the process and wait for it, killing it first if force is set."""
+        if self.closed:
+            return
+
+        for pipe in (self.proc.stdin, self.proc.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+        if force and self.proc.poll() is None:
+            self.proc.kill()
+        self.wait()
+
+        self.child_fd = -1
+        self.closed = True
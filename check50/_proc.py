@@ -0,0 +1,177 @@
+"""
+Inspection of running processes through Linux's /proc filesystem
+"""
+
+import fcntl
+import os
+import platform
+import struct
+import termios
+
+# Numbers of the system calls that read from a file descriptor (read and readv) per architecture
+_READ_SYSCALLS = {
+    "x86_64": {0, 19},
+    "aarch64": {63, 65}
+}
+
+# Numbers of the system calls that sleep for a while (nanosleep and clock_nanosleep) per architecture,
+# a thread blocked in one of these is as good as runnable
+_SLEEP_SYSCALLS = {
+    "x86_64": {35, 230},
+    "aarch64": {101, 115}
+}
+
+
+def waiting_for_input(pid):
+    """
+    Whether all of process group pid is waiting for input: whether every thread of every process in the group
+    is blocked (none is runnable, or just sleeping for a while), at least one of them reading from pid's stdin,
+    with no input left unread on there.
+
+    Returns a snapshot of the blocked threads if so, that changes as soon as any of them runs, such that
+    callers can tell whether the group stays blocked between two calls, and ``None`` otherwise. Also returns
+    ``None`` wherever this can't be determined (e.g. on platforms other than Linux).
+
+    :param pid: id of the process, that leads its process group
+    :type pid: int
+    :rtype: frozenset or None
+    """
+    machine = platform.machine()
+    if machine not in _READ_SYSCALLS:
+        return None
+
+    try:
+        stdin = _identity(os.stat(f"/proc/{pid}/fd/0"))
+    except OSError:
+        return None
+
+    # A process group's processes are almost always among pid's descendants, which are cheap to look at.
+    # Only once they are all blocked, look for processes of the group that left pid's tree as well (e.g. orphans)
+    pids = set(_descendants(pid))
+    snapshot = []
+    readers = []
+    if not _blocked(pids, stdin, machine, snapshot, readers):
+        return None
+    if not _blocked(_group(pid) - pids, stdin, machine, snapshot, readers):
+        return None
+
+    if not readers or any(_unread(reader) for reader in readers):
+        return None
+    return frozenset(snapshot)
+
+
+def _blocked(pids, stdin, machine, snapshot, readers):
+    """
+    Whether all threads of processes pids are blocked, adding what each thread is blocked in to snapshot,
+    and the processes that are reading from stdin to readers.
+    """
+    for pid in pids:
+        try:
+            tids = os.listdir(f"/proc/{pid}/task")
+        except OSError:
+            # The process exited meanwhile
+            continue
+
+        for tid in tids:
+            thread = _thread(pid, tid, machine)
+            if thread is None:
+                return False
+            snapshot.append(thread)
+
+            syscall = thread[1]
+            if syscall[:2] in ((number, 0) for number in _READ_SYSCALLS[machine]) and pid not in readers:
+                try:
+                    if _identity(os.stat(f"/proc/{pid}/fd/0")) == stdin:
+                        readers.append(pid)
+                except OSError:
+                    pass
+    return True
+
+
+def _thread(pid, tid, machine):
+    """
+    A (tid, syscall, timeslices) triple of the system call that thread tid of process pid is blocked in,
+    and the number of times it ran. ``None`` if the thread is runnable (or sleeping for a while).
+    Threads that exited count as blocked forever.
+    """
+    path = f"/proc/{pid}/task/{tid}"
+    try:
+        with open(f"{path}/stat") as f:
+            # E.g. "1234 (python3) S 1233 ...", where the name may hold spaces and parentheses itself
+            state = f.read().rpartition(")")[2].split()[0]
+        if state in ("Z", "X"):
+            return (tid, (), 0)
+        if state == "R":
+            return None
+
+        with open(f"{path}/syscall") as f:
+            # E.g. "0 0x0 0x7f485f1f1b03 ...", or "running" if the thread is not in a system call
+            fields = f.read().split()
+        if not fields or not fields[0].isdigit():
+            return None
+        syscall = (int(fields[0]),) + tuple(int(field, 16) for field in fields[1:])
+        if syscall[0] in _SLEEP_SYSCALLS[machine]:
+            return None
+
+        # E.g. "35005784 6100007 12", time on the cpu, time waiting for it, and the number of times it ran
+        try:
+            with open(f"{path}/schedstat") as f:
+                timeslices = int(f.read().split()[2])
+        except FileNotFoundError:
+            timeslices = 0
+        return (tid, syscall, timeslices)
+    except FileNotFoundError:
+        # The thread exited meanwhile
+        return (tid, (), 0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _unread(pid):
+    """Whether process pid's stdin holds any input that is yet to be read."""
+    try:
+        fd = os.open(f"/proc/{pid}/fd/0", os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    except OSError:
+        return False
+    try:
+        return struct.unpack("i", fcntl.ioctl(fd, termios.FIONREAD, bytes(4)))[0] > 0
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def _descendants(pid):
+    """Yield pid and the ids of all its (living) descendants."""
+    yield pid
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return
+
+    for task in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children = f.read().split()
+        except OSError:
+            continue
+        for child in children:
+            yield from _descendants(int(child))
+
+
+def _group(pgid):
+    """The ids of all processes in process group pgid."""
+    members = set()
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            if os.getpgid(int(entry.name)) == pgid:
+                members.add(int(entry.name))
+        except OSError:
+            pass
+    return members
+
+
+def _identity(stat):
+    return stat.st_dev, stat.st_ino, stat.st_rdev
@@ -0,0 +1,83 @@
+"""
+Persistent history of how long each check took to run
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import statistics
+import tempfile
+
+import lib50
+
+#: Number of most recent wall times remembered per check
+HISTORY_SIZE = 10
+
+# Directories that change by merely running the checks, and are left out of fingerprints
+_IGNORED_DIRECTORIES = {"__pycache__", ".git"}
+
+
+def fingerprint(directory):
+    """
+    Fingerprint directory by the relative path, size and modification time of every file within it.
+
+    :param directory: directory to fingerprint
+    :type directory: str / Path
+    :rtype: str
+    """
+    sha256 = hashlib.sha256()
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in _IGNORED_DIRECTORIES)
+        for file in sorted(files):
+            path = Path(root) / file
+            stat = path.stat()
+            sha256.update(f"{path.relative_to(directory)}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+    return sha256.hexdigest()
+
+
+class Timings:
+    """
+    Wall times of the most recent runs of each check, for one slug and one version
+    (fingerprint) of its checks, stored under ``timings`` in check50's local path.
+    """
+
+    def __init__(self, slug, check_dir):
+        key = hashlib.sha256(f"{slug}\0{fingerprint(check_dir)}".encode()).hexdigest()
+        self.path = lib50.get_local_path() / "timings" / f"{key}.json"
+
+        try:
+            with open(self.path) as f:
+                self.history = json.load(f)["checks"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.history = {}
+
+    def expected(self):
+        """Map every check with a history to its expected (median) wall time in seconds."""
+        return {name: statistics.median(times) for name, times in self.history.items() if times}
+
+    def record(self, results):
+        """Remember the wall time of each CheckResult in results that actually ran."""
+        for result in results:
+            if result.time is not None:
+                times = self.history.setdefault(result.name, [])
+                times.append(result.time)
+                del times[:-HISTORY_SIZE]
+
+    def save(self):
+        """
+        Write the history to disk, atomically replacing any previous version.
+        Silently gives up if it can't be written (e.g. to a full or read-only disk).
+        """
+        f = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=self.path.parent, delete=False) as f:
+                json.dump({"checks": self.history}, f)
+            os.replace(f.name, self.path)
+        except OSError:
+            if f is not None:
+                try:
+                    os.remove(f.name)
+                except OSError:
+                    pass
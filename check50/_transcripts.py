@@ -0,0 +1,158 @@
+"""
+Transcripts of the processes a check runs, recorded against a reference solution and replayed against submissions
+"""
+
+import asyncio
+import json
+import os
+import time
+
+from . import internal, _api
+
+#: Name of the file in the checks directory that holds the transcripts of all checks
+FILENAME = "transcripts.json"
+
+# Transcripts recorded during the current check
+_recorded = []
+internal.register.before_every(_recorded.clear)
+
+# Transcripts loaded per checks directory, see load
+_loaded = {}
+
+
+class Transcript:
+    """
+    Everything one process (started by :class:`check50.run`) was given and gave back:
+    its command, each line of input, the output before each line of input and after the last, and its exit code.
+    """
+
+    def __init__(self, command, env, tty, limits):
+        self.command = command
+        self.env = env
+        self.tty = tty
+        self.limits = limits
+        self.stdin = []
+        self.stdout = [""]
+        self.exitcode = None
+
+    def output(self, data):
+        self.stdout[-1] += data
+
+    def input(self, line):
+        """Record line (None for EOF) as sent, after which output starts a new chunk."""
+        self.stdin.append(line)
+        self.stdout.append("")
+
+    def to_dict(self):
+        return {"command": self.command, "env": self.env, "tty": self.tty, "limits": self.limits,
+                "stdin": self.stdin, "stdout": self.stdout, "exit": self.exitcode}
+
+
+def record(command, env, tty, limits):
+    """Start the transcript of a process started by check50.run, or return None if check50 is not recording."""
+    if not internal.recording:
+        return None
+    transcript = Transcript(command, dict(env), tty, limits)
+    _recorded.append(transcript)
+    return transcript
+
+
+def save(check_name):
+    """
+    Store the transcripts recorded during check check_name in the run's root directory, for collect to find.
+    Processes that did not exit (that were killed instead) can't be replayed, and are left out.
+    """
+    transcripts = [transcript.to_dict() for transcript in _recorded if transcript.exitcode is not None]
+    directory = internal.run_root_dir / ".transcripts"
+    directory.mkdir(exist_ok=True)
+    with open(directory / f"{check_name}.json", "w") as f:
+        json.dump(transcripts, f)
+
+
+def collect(run_root_dir, path):
+    """
+    Merge the transcripts of all checks that ran in run_root_dir into (the transcripts in) file path.
+    For checks to replay them, path is to end up as FILENAME in the checks directory.
+    """
+    try:
+        with open(path) as f:
+            transcripts = json.load(f)
+    except (OSError, ValueError):
+        transcripts = {}
+
+    for file in sorted((run_root_dir / ".transcripts").glob("*.json")):
+        with open(file) as f:
+            transcripts[file.stem] = json.load(f)
+
+        # A check that started no processes has nothing to replay
+        if not transcripts[file.stem]:
+            del transcripts[file.stem]
+
+    with open(path, "w") as f:
+        json.dump(transcripts, f, separators=(",", ":"))
+
+
+def load(check_name):
+    """Return the recorded transcripts of check check_name, or None if there are none."""
+    path = internal.check_dir / FILENAME
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    if _loaded.get(path, (None,))[0] != mtime:
+        with open(path) as f:
+            _loaded[path] = (mtime, json.load(f))
+    return _loaded[path][1].get(check_name)
+
+
+def replay(transcripts, timeout):
+    """
+    Run the command of each of transcripts (concurrently), send it all of its input at once, and compare
+    its output and exit code to those recorded, within timeout seconds overall.
+
+    Returns whether every process output and exited just like its transcript says, in which case the check passes.
+    Any difference may well be harmless (e.g. in a prompt the check does not look at), so if not, it is up to
+    the check itself to decide, and replay leaves nothing in the log.
+
+    :rtype: bool
+    """
+    log_length = len(_api._log)
+    _api.log(_("replaying {} runs of the reference solution...").format(len(transcripts)))
+    deadline = time.monotonic() + timeout
+
+    async def replay_one(transcript):
+        process = _api.run_async(transcript["command"], env=transcript["env"], tty=transcript["tty"],
+                                 limits=transcript["limits"])
+        try:
+            # Send all input right away, rather than wait for a prompt before each line
+            process.process.delaybeforesend = None
+            try:
+                for line in transcript["stdin"]:
+                    if line is None:
+                        process.process.sendeof()
+                    else:
+                        process.process.sendline(line)
+            except OSError:
+                # The process exited before reading all of its input
+                pass
+
+            try:
+                output = await process.stdout(timeout=max(0, deadline - time.monotonic()))
+            except _api.Failure:
+                # E.g. the process did not exit in time, or its output is not valid text
+                return False
+
+            expected = "".join(transcript["stdout"]).replace("\r\n", "\n").lstrip("\n")
+            return output == expected and process.exitcode == transcript["exit"]
+        finally:
+            process.kill()
+
+    async def replay_all():
+        return await asyncio.gather(*(replay_one(transcript) for transcript in transcripts))
+
+    if all(asyncio.run(replay_all())):
+        return True
+
+    del _api._log[log_length:]
+    return False
@@ -0,0 +1,68 @@
+"""
+Functions that build the (copy-on-write) working directory of each check from that of its dependency
+"""
+
+import errno
+import os
+import shutil
+import stat
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request that clones all extents of one file into another (FICLONE from linux/fs.h)
+_FICLONE = 0x40049409
+
+# Errors signalling that the filesystem (or the pair of files) does not support reflinks
+_REFLINK_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS}
+
+# Maps a device (st_dev) to whether its filesystem supports reflinks, so that we only probe once
+_reflink_support = {}
+
+
+def clone_tree(src, dst):
+    """
+    Recreate directory ``src`` at ``dst``, sharing the data of all files where possible.
+
+    Files are reflinked (e.g. on btrfs, xfs, zfs and APFS-like filesystems), such that the
+    filesystem itself only copies a block once either of the two files writes to it.
+    On filesystems that support no reflinks, files are copied instead.
+    Special files (FIFOs, sockets and devices) are left out, as reading them may block or fail.
+    """
+    return shutil.copytree(src, dst, copy_function=_clone_regular)
+
+
+def _clone_regular(src, dst):
+    """Like clone, but skip src unless it is a regular file (or a symlink to one)."""
+    try:
+        mode = os.stat(src).st_mode
+    except OSError:
+        # E.g. a dangling symlink, for which clone raises the error that copytree expects
+        mode = None
+    if mode is not None and not stat.S_ISREG(mode):
+        return dst
+    return clone(src, dst)
+
+
+def clone(src, dst):
+    """Copy file ``src`` to ``dst`` (including metadata), using a reflink if possible."""
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    device = os.stat(src).st_dev
+    if fcntl is not None and _reflink_support.get(device, True):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError as e:
+            if e.errno not in _REFLINK_UNSUPPORTED:
+                raise
+            _reflink_support[device] = False
+        else:
+            _reflink_support[device] = True
+            shutil.copystat(src, dst)
+            return dst
+
+    return shutil.copy2(src, dst)
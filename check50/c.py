@@ -1,11 +1,18 @@
+import json
 import os
 import re
+import select
+import shlex
+import shutil
 import tempfile
+import threading
+import time
 from pathlib import Path
+from urllib.parse import unquote, urlparse
 import xml.etree.cElementTree as ET
 
-from ._api import run, log, Failure
-from . import internal
+from ._api import run, log, data, Failure, _log
+from . import internal, _cache
 
 #: Default compiler for :func:`check50.c.compile`
 CC = "clang"
@@ -13,14 +20,55 @@ CC = "clang"
 #: Default CFLAGS for :func:`check50.c.compile`
 CFLAGS = {"std": "c11", "ggdb": True, "lm": True}
 
+#: CFLAGS added by :func:`check50.c.compile` with ``sanitize=True``
+SANITIZE_CFLAGS = {"fsanitize": "address,undefined", "fsanitize_recover": "address", "fno_omit_frame_pointer": True}
 
-def compile(*files, exe_name=None, cc=CC, max_log_lines=50, **cflags):
+# Compilers that may run on top of one per compilation, where check50.internal.compile_slots is not set
+_compile_slots = threading.BoundedSemaphore(os.cpu_count() or 1)
+
+# Environment variables that affect what the compiler does
+_COMPILER_ENV = ("CPATH", "C_INCLUDE_PATH", "LIBRARY_PATH", "LD_LIBRARY_PATH")
+
+# Flags with which compilers report their diagnostics as JSON, by (part of) the name of the compiler
+_DIAGNOSTICS_FLAGS = {
+    "clang": ["-fdiagnostics-format=sarif", "-Wno-sarif-format-unstable"],
+    "gcc": ["-fdiagnostics-format=json"]
+}
+
+# Flags with which clang and gcc render their diagnostics as text without ANSI codes, even in a terminal
+_TEXT_FLAGS = ["-fdiagnostics-color=never"]
+
+# Matches the file of an #include "file" (group 1) or #include <file> (group 2) directive
+_INCLUDE = re.compile(rb'^\s*#\s*include\s*(?:"([^"]+)"|<([^>]+)>)', re.MULTILINE)
+
+# Matches ANSI escape codes
+_ANSI = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
+
+# Matches the first line of an error in a sanitizer's report: one of AddressSanitizer (or LeakSanitizer),
+# one leak in LeakSanitizer's list of leaks, or one of UndefinedBehaviorSanitizer (which starts with its location)
+_SANITIZER_ERROR = re.compile(r"==\d+==ERROR: (?:Address|Leak)Sanitizer: (?P<asan>.*)"
+                              r"|(?P<leak>(?:Direct|Indirect) leak of .*?)(?: allocated from:)?"
+                              r"|(?P<file>[^\s:]+):(?P<line>\d+):\d+: runtime error: (?P<ubsan>.*)")
+
+# Matches a frame of a stack trace in a sanitizer's report, e.g. "#1 0x55a3a535e1a4 in main /tmp/foo.c:4:5",
+# along with its file and line, if known
+_SANITIZER_FRAME = re.compile(r"\s*#\d+ 0x[0-9a-f]+(?: in .*? (?P<file>[^\s()]+?):(?P<line>\d+)(?::\d+)?)?(?: .*)?")
+
+# Matches the memory access of an error of AddressSanitizer, e.g. "READ of size 4 at 0x602000000010 thread T0"
+_SANITIZER_ACCESS = re.compile(r"(READ|WRITE) of size (\d+)")
+
+
+def compile(*files, exe_name=None, cc=CC, max_log_lines=50, cache=True, sanitize=False, **cflags):
     """
     Compile C source files.
 
     :param files: filenames to be compiled
     :param exe_name: name of resulting executable
     :param cc: compiler to use (:data:`check50.c.CC` by default)
+    :param cache: whether to reuse the outcome of an earlier, identical compilation, see below
+    :param sanitize: whether to compile with AddressSanitizer (and LeakSanitizer) and UndefinedBehaviorSanitizer, \
+                     see :func:`check50.c.sanitize`. UndefinedBehaviorSanitizer requires clang, with other \
+                     compilers (e.g. gcc, which reports its errors to the program's stderr) it is left out
     :param cflags: additional flags to pass to the compiler
     :raises check50.Failure: if compilation failed (i.e., if the compiler returns a non-zero exit status).
     :raises RuntimeError: if no filenames are specified
@@ -38,6 +86,24 @@ def compile(*files, exe_name=None, cc=CC, max_log_lines=50, **cflags):
     In the same vein, the default CFLAGS may be overridden via keyword arguments::
 
         check50.c.compile("foo.c", "bar.c", std="c99", lm=False) # clang foo.c bar.c -o foo -std=c99 -ggdb
+
+    The outcome of every compilation (the executable, and the compiler's output) is cached in check50's local path.
+    Compiling the same files (and the headers they include, be it from their own directory, or from one given by
+    ``-I``, ``-iquote``, ``CPATH`` or ``C_INCLUDE_PATH``) with the same compiler, command and flags again restores
+    that outcome, rather than running the compiler. Headers in the system's include directories, such as
+    ``<cs50.h>``, are considered part of the compiler, so pass ``cache=False`` when those may change.
+
+    Several ``.c`` files are compiled into objects of their own, several at a time, which are then linked into the
+    executable. Objects are cached per file, so after a change to one of the files only that file is compiled again.
+    Each compilation runs one compiler at a time, and the compilations of all checks together at most as many more
+    as there are CPUs.
+
+    clang and gcc are asked to report their diagnostics (errors and warnings) as JSON. These are added to the check's
+    payload as ``diagnostics``, a list of records like ``{"file": "foo.c", "line": 3, "column": 5, "level": "error",
+    "message": "..."}`` sorted by file and line, see :func:`check50.data`. Should compilation fail, the files are
+    compiled once more without JSON, such that the diagnostics are logged as the compiler renders them as text (along
+    with the lines of code that they refer to). That rendering is cached too. The output of other compilers is logged
+    as is.
     """
 
     if not files:
@@ -46,23 +112,57 @@ def compile(*files, exe_name=None, cc=CC, max_log_lines=50, **cflags):
     if exe_name is None and files[0].endswith(".c"):
         exe_name = Path(files[0]).stem
 
+    sources = files
     files = " ".join(files)
 
     flags = CFLAGS.copy()
+    if sanitize:
+        flags.update(SANITIZE_CFLAGS)
+        if _compiler_family(cc) != "clang":
+            flags["fsanitize"] = "address"
     flags.update(cflags)
-    flags = " ".join((f"-{flag}" + (f"={value}" if value is not True else "")).replace("_", "-")
-                     for flag, value in flags.items() if value)
+    flags = [(f"-{flag}" + (f"={value}" if value is not True else "")).replace("_", "-")
+             for flag, value in flags.items() if value]
+    flag_list, flags = flags, " ".join(flags)
 
     out_flag = f" -o {exe_name} " if exe_name is not None else " "
 
-    process = run(f"{cc} {files}{out_flag}{flags}")
+    command = f"{cc} {files}{out_flag}{flags}"
+    executable = exe_name if exe_name is not None else "a.out"
+
+    # Have the compiler report diagnostics as JSON, which is no business of the command logged
+    diagnostics_flags = _diagnostics_flags(cc)
 
-    # Strip out ANSI codes
-    stdout = re.sub(r"\x1B\[[0-?]*[ -/]*[@-~]", "",  process.stdout())
+    compile_cache = _cache.CompileCache() if cache else None
+    key = _cache_key(compile_cache, cc, " ".join([command, *diagnostics_flags]), sources) if compile_cache else None
+    hit = compile_cache.load(key, executable) if key else None
+
+    log(_("running {}...").format(command))
+    if hit:
+        stdout, exitcode, rendering = hit
+    else:
+        stdout, exitcode = _run_compiler(cc, sources, exe_name, flag_list + diagnostics_flags, compile_cache)
+        rendering = None
+
+        if exitcode != 0 and diagnostics_flags:
+            # A compiler that doesn't support the format fails without reporting any diagnostics as JSON
+            if _diagnostics(stdout)[0] is None:
+                stdout, exitcode = _run_compiler(cc, sources, exe_name, flag_list, compile_cache)
+            # Only without JSON does the compiler render its diagnostics as text, quoting the code they refer to.
+            # That rendering is cached along with the JSON, such that it's produced once per failed compilation
+            else:
+                rendering, _exitcode = _run_compiler(cc, sources, exe_name, flag_list + _TEXT_FLAGS, compile_cache)
+
+        if key:
+            compile_cache.store(key, stdout, exitcode, executable if exitcode == 0 else None, rendering)
+
+    records, text = _diagnostics(stdout)
+    if records:
+        data(diagnostics=records)
 
     # Log max_log_lines lines of output in case compilation fails
-    if process.exitcode != 0:
-        lines = stdout.splitlines()
+    if exitcode != 0:
+        lines = rendering.splitlines() if rendering is not None else text
 
         if len(lines) > max_log_lines:
             lines = lines[:max_log_lines // 2] + lines[-(max_log_lines // 2):]
@@ -73,13 +173,300 @@ def compile(*files, exe_name=None, cc=CC, max_log_lines=50, **cflags):
         raise Failure("code failed to compile")
 
 
-def valgrind(command, env={}):
+def _run_compiler(cc, sources, exe_name, flags, compile_cache):
+    """Compile sources with flags into exe_name (a.out if None), without logging, and return the compiler's (output, exitcode)."""
+    if len(sources) > 1 and all(source.endswith(".c") for source in sources):
+        return _compile_separately(cc, sources, exe_name, flags, compile_cache)
+
+    out_flag = f" -o {exe_name} " if exe_name is not None else " "
+    log_length = len(_log)
+    try:
+        process = run(f"{cc} {' '.join(sources)}{out_flag}{' '.join(flags)}")
+        return process.stdout(), process.exitcode
+    finally:
+        del _log[log_length:]
+
+
+def _compile_separately(cc, sources, executable, flags, compile_cache):
+    """
+    Compile each of sources into an object of its own, several at a time, then link those into executable.
+    Objects are cached (in compile_cache, if any) per source, so only sources that changed are compiled again.
+    Returns the compiler's combined (output, exitcode), as if it compiled all sources at once.
+    """
+    # Libraries are for the linker only
+    compile_flags = [flag for flag in flags if not flag.startswith(("-l", "-L"))]
+
+    # clang warns about flags unused in either step, which it wouldn't when compiling all sources at once
+    if _compiler_family(cc) == "clang":
+        compile_flags.append("-Qunused-arguments")
+        flags = flags + ["-Qunused-arguments"]
+
+    compile_flags = " ".join(compile_flags)
+
+    # The log of each step is of no use, just that of the command the steps stand in for
+    log_length = len(_log)
+
+    with tempfile.TemporaryDirectory(dir=internal.run_root_dir) as objects_dir:
+        # Objects are numbered, as sources in different directories may share a name
+        objects = [os.path.join(objects_dir, f"{i}.o") for i in range(len(sources))]
+
+        results = []
+        commands = []
+        for source, obj in zip(sources, objects):
+            command = f"{cc} -c {source} {compile_flags}"
+            key = _cache_key(compile_cache, cc, command, [source]) if compile_cache else None
+            hit = compile_cache.load(key, obj) if key else None
+            results.append(hit[:2] if hit else None)
+            commands.append((f"{cc} -c {source} -o {obj} {compile_flags}", key, obj))
+
+        try:
+            for i, (output, exitcode) in _run_all(commands, [i for i, result in enumerate(results) if not result]):
+                results[i] = output, exitcode
+                _command, key, obj = commands[i]
+                if key:
+                    compile_cache.store(key, output, exitcode, obj if exitcode == 0 else None)
+
+            outputs = [output for output, _exitcode in results]
+            exitcode = next((exitcode for _output, exitcode in results if exitcode != 0), 0)
+
+            if exitcode == 0:
+                process = run(f"{cc} {' '.join(objects)} -o {executable} {' '.join(flags)}")
+                outputs.append(process.stdout())
+                exitcode = process.exitcode
+        finally:
+            del _log[log_length:]
+
+    return "".join(outputs), exitcode
+
+
+def _run_all(commands, indices):
+    """
+    Run the command of each of commands[i] for i in indices, several at a time, and yield (i, (output, exitcode))
+    for each as soon as it is done. One command runs at a time, as a single compiler would, and more only while
+    there are CPUs to spare among the compilers of all checks, see :data:`check50.internal.compile_slots`.
+    """
+    slots = internal.compile_slots if internal.compile_slots is not None else _compile_slots
+    pending = list(indices)
+
+    # Steps (see _api._block) of each running command, by the index of the command
+    running = {}
+    try:
+        while pending or running:
+            while pending and (not running or slots.acquire(False)):
+                i = pending.pop(0)
+                process = run(commands[i][0])
+                steps = process._stdout(None, None, True, 3, False)
+                running[i] = [process, steps, next(steps), bool(running)]
+
+            # Block until any of the steps can go on, see _api._block
+            now = time.monotonic()
+            fds = [wait[0] for _process, _steps, wait, _slot in running.values() if wait[0] is not None]
+            timeout = min(wait[1] for _process, _steps, wait, _slot in running.values())
+            if fds:
+                readable = set(select.select(fds, [], [], timeout)[0])
+            else:
+                time.sleep(timeout)
+                readable = set()
+            elapsed = time.monotonic() - now
+
+            for i, entry in list(running.items()):
+                process, steps, (fd, timeout), slot = entry
+                if fd not in readable and elapsed < timeout:
+                    # Not yet, resume waiting for what is left of the timeout
+                    entry[2] = fd, timeout - elapsed
+                    continue
+
+                try:
+                    entry[2] = steps.send(fd in readable)
+                except StopIteration as e:
+                    del running[i]
+                    if slot:
+                        slots.release()
+                    yield i, (e.value, process.exitcode)
+    finally:
+        for process, _steps, _wait, slot in running.values():
+            process.kill()
+            if slot:
+                slots.release()
+
+
+def _diagnostics_flags(cc):
+    """Flags with which compiler cc reports diagnostics as JSON (SARIF for clang), if known."""
+    return _DIAGNOSTICS_FLAGS.get(_compiler_family(cc), [])
+
+
+def _compiler_family(cc):
+    """Whether compiler cc is "clang" or "gcc", or None if neither."""
+    compiler = shutil.which(cc)
+
+    # E.g. cc, which is a link to gcc
+    name = os.path.basename(os.path.realpath(compiler)) if compiler else os.path.basename(cc)
+    for family in ("clang", "gcc"):
+        if family in name:
+            return family
+    return None
+
+
+def _diagnostics(output):
+    """
+    Split the output of the compiler into its diagnostics, as records sorted by file and line without duplicates,
+    and all other lines of output (e.g. those of the linker). The records are None if the output holds no JSON.
+    """
+    decoder = json.JSONDecoder()
+    records = None
+    text = []
+
+    pos = 0
+    while pos < len(output):
+        end = output.find("\n", pos)
+        end = len(output) if end == -1 else end
+
+        if output[pos] in "[{":
+            try:
+                document, stop = decoder.raw_decode(output, pos)
+                found = list(_records(document))
+            except (ValueError, KeyError, AttributeError, TypeError):
+                pass
+            else:
+                records = (records or []) + found
+                pos = stop + 1 if output.startswith("\n", stop) else stop
+                continue
+
+        # Strip out ANSI codes
+        text.append(_ANSI.sub("", output[pos:end]))
+        pos = end + 1
+
+    if records is not None:
+        key = lambda record: (record["file"] or "", record["line"] or 0, record["column"] or 0)
+        records = sorted({tuple(record.items()): record for record in records}.values(), key=key)
+    return records, text
+
+
+def _records(document):
+    """Yield a record of each error or warning in document, as output by clang (SARIF) or gcc (JSON)."""
+    if isinstance(document, dict):
+        # SARIF, see https://docs.oasis-open.org/sarif/sarif/v2.1.0/sarif-v2.1.0.html
+        diagnostics = []
+        for run_ in document["runs"]:
+            for result in run_.get("results", []):
+                location = (result.get("locations") or [{}])[0].get("physicalLocation", {})
+                region = location.get("region", {})
+                diagnostics.append((result.get("level", "warning"), result["message"]["text"],
+                                    _sarif_path(location.get("artifactLocation", {}).get("uri")),
+                                    region.get("startLine"), region.get("startColumn")))
+    else:
+        diagnostics = []
+        for diagnostic in document:
+            caret = (diagnostic.get("locations") or [{}])[0].get("caret", {})
+            diagnostics.append((diagnostic["kind"], diagnostic["message"],
+                                caret.get("file"), caret.get("line"), caret.get("column")))
+
+    for level, message, file, line, column in diagnostics:
+        if level != "note":
+            yield {"file": file, "line": line, "column": column, "level": level, "message": message}
+
+
+def _sarif_path(uri):
+    """The path of the file at uri (e.g. file:///tmp/foo.c), relative to the current directory if within it."""
+    if not uri:
+        return None
+    path = unquote(urlparse(uri).path)
+    relative = os.path.relpath(path)
+    return path if relative.startswith("..") else relative
+
+
+def _cache_key(compile_cache, cc, command, sources):
+    """
+    Key for compiling sources with command in compile_cache, or None if the compilation can't be cached.
+    The key covers the compiler (by its path, size and modification time), command, the environment variables
+    that affect the compiler, and the sources along with all headers they include from outside the system's
+    include directories, see _included.
+    """
+    compiler = shutil.which(cc)
+    if compiler is None:
+        return None
+
+    compiler = os.path.realpath(compiler)
+    stat = os.stat(compiler)
+    parts = [compiler, str(stat.st_size), str(stat.st_mtime_ns), command]
+    parts.extend(f"{name}={os.environ.get(name, '')}" for name in _COMPILER_ENV)
+
+    try:
+        return compile_cache.key(parts, _included(sources, command))
+    except OSError:
+        # E.g. a source that does not exist, leave it to the compiler to complain
+        return None
+
+
+def _included(sources, command):
+    """
+    Return sources, followed by every header they (transitively) include that exists: those included by
+    ``#include "..."``, and those included by ``#include <...>`` that are found outside of the system's include
+    directories, i.e. in those of command's ``-I`` flags, or of the CPATH and C_INCLUDE_PATH environment variables.
+    """
+    quote_dirs, angle_dirs = _include_dirs(command)
+
+    files = list(sources)
+    seen = set(files)
+    for file in files:
+        with open(file, "rb") as f:
+            includes = _INCLUDE.findall(f.read())
+
+        for quoted, angled in includes:
+            # The preprocessor looks for "..." headers in the directory of the including file (or the current
+            # one), then in the directories of -iquote flags, then in those it looks for <...> headers in
+            if quoted:
+                name = os.fsdecode(quoted)
+                dirs = [os.path.dirname(file), ".", *quote_dirs, *angle_dirs]
+            else:
+                name = os.fsdecode(angled)
+                dirs = angle_dirs
+
+            for directory in dirs:
+                header = os.path.normpath(os.path.join(directory, name))
+                if os.path.isfile(header):
+                    if header not in seen:
+                        seen.add(header)
+                        files.append(header)
+                    break
+    return files
+
+
+def _include_dirs(command):
+    """
+    The directories in which the preprocessor looks for the headers that command includes, other than the system's:
+    those of ``-iquote`` flags (for ``#include "..."`` only), and those of ``-I`` flags, CPATH and C_INCLUDE_PATH.
+    """
+    quote_dirs, angle_dirs = [], []
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        args = []
+
+    for arg, next_arg in zip(args, args[1:] + [""]):
+        for flag, dirs in (("-iquote", quote_dirs), ("-I", angle_dirs)):
+            if arg.startswith(flag):
+                # E.g. -Iinclude or -I include
+                dirs.append(arg[len(flag):] or next_arg)
+                break
+
+    # An empty directory in a list of them stands for the current one
+    for name in ("CPATH", "C_INCLUDE_PATH"):
+        if os.environ.get(name):
+            angle_dirs.extend(directory or "." for directory in os.environ[name].split(os.pathsep))
+    return quote_dirs, angle_dirs
+
+
+def valgrind(command, env={}, limits=None):
     """Run a command with valgrind.
 
     :param command: command to be run
     :type command: str
     :param env: environment in which to run command
     :type env: str
+    :param limits: resource limits of the process, see :class:`check50.run`. \
+                   Note that valgrind itself takes a lot more memory than the command alone
+    :type limits: dict
     :raises check50.Failure: if, at the end of the check, valgrind reports any errors
 
     This function works exactly like :func:`check50.run`, with the additional effect that ``command`` is run through
@@ -94,24 +481,166 @@ def valgrind(command, env={}):
         It is recommended that the student's code is compiled with the `-ggdb`
         flag so that additional information, such as the file and line number at which
         the issue was detected can be included in the log as well.
+
+    A program compiled with ``sanitize=True`` (see :func:`check50.c.compile`) is run with :func:`check50.c.sanitize`
+    instead, such that a check switches from valgrind to the much faster sanitizers by that argument alone.
     """
+    # Programs compiled with sanitizers don't run under valgrind, but check themselves
+    if _sanitized(command):
+        return sanitize(command, env=env, limits=limits)
+
     xml_file = tempfile.NamedTemporaryFile()
     internal.register.after_check(lambda: _check_valgrind(xml_file))
 
     # Ideally we'd like for this whole command not to be logged.
-    return run(f"valgrind --show-leak-kinds=all --xml=yes --xml-file={xml_file.name} -- {command}", env=env)
+    # With --error-limit, valgrind stops collecting errors once it has seen too many
+    return run(f"valgrind --show-leak-kinds=all --error-limit=yes --xml=yes --xml-file={xml_file.name} -- {command}",
+               env=env, limits=limits)
+
+
+def sanitize(command, env={}, limits=None):
+    """Run a command compiled with sanitizers (see :func:`check50.c.compile`).
+
+    :param command: command to be run
+    :type command: str
+    :param env: environment in which to run command
+    :type env: str
+    :param limits: resource limits of the process, see :class:`check50.run`. \
+                   Note that AddressSanitizer reserves a lot of address space, which a ``memory`` limit prevents
+    :type limits: dict
+    :raises check50.Failure: if, at the end of the check, the sanitizers report any errors
+
+    This function works exactly like :func:`check50.c.valgrind`, except that rather than valgrind, the sanitizers
+    compiled into the program look for memory leaks and other bugs. That makes the program only a few times slower,
+    rather than the tens of times that valgrind does. Any errors are printed to the log as by
+    :func:`check50.c.valgrind`, after which the check fails. Should the check fail otherwise (e.g. on the program's
+    output), the errors are printed to the log all the same.
+
+    Example usage::
+
+        check50.c.compile("leaky.c", sanitize=True)
+        check50.c.sanitize("./leaky").stdin("foo").stdout("bar").exit(0)
+
+    .. note::
+        As under valgrind, the program keeps running past the errors that the sanitizers detect, provided it was
+        compiled with ``-fsanitize-recover=address`` (as :func:`check50.c.compile` does), and exits with its own
+        exit code. Only LeakSanitizer's report of leaks, at exit, doesn't change that exit code.
+    """
+    log_dir = tempfile.TemporaryDirectory()
+    internal.register.after_check(lambda: _check_sanitizers(log_dir), on_failure=True)
+
+    # Both write their reports to files in log_dir rather than to stderr, which the check reads
+    log_path = os.path.join(log_dir.name, "sanitizer")
+    options = {"ASAN_OPTIONS": f"log_path={log_path}:halt_on_error=0:exitcode=0",
+               "UBSAN_OPTIONS": f"log_path={log_path}:print_stacktrace=1"}
+
+    # Options of the environment, if any, come last and so take precedence
+    env = {**env, **{name: ":".join(filter(None, (value, env.get(name, os.environ.get(name)))))
+                     for name, value in options.items()}}
+    return run(command, env=env, limits=limits)
+
+
+def _sanitized(command):
+    """Whether the program that command runs was compiled with sanitizers."""
+    try:
+        program = shlex.split(command)[0]
+        with open(shutil.which(program) or program, "rb") as f:
+            data = f.read()
+    except (OSError, ValueError, IndexError):
+        return False
+    return b"__asan_init" in data or b"__ubsan_handle_" in data
+
+
+def _check_sanitizers(log_dir):
+    """Log and report any errors encountered by the sanitizers."""
+    log(_("checking for sanitizer errors..."))
+
+    # Ensure that we don't get duplicate error messages.
+    reported = set()
+    try:
+        for path in sorted(Path(log_dir.name).iterdir()):
+            for msg in _sanitizer_errors(path.read_text(errors="replace")):
+                if msg not in reported:
+                    log(msg)
+                    reported.add(msg)
+    finally:
+        log_dir.cleanup()
+
+    # Only raise exception if we encountered errors.
+    if reported:
+        raise Failure(_("sanitizer tests failed; see log for more information."))
+
+
+def _sanitizer_errors(report):
+    """Yield a message per error in a sanitizer's report, with the location of the error in the student's code, if any."""
+    errors = []
+    for line in report.splitlines():
+        match = _SANITIZER_ERROR.fullmatch(line)
+        if match:
+            if match["asan"] is not None and not match["asan"].startswith("detected memory leaks"):
+                # E.g. "heap-use-after-free on address 0x602000000010 at pc ..."
+                errors.append({"what": match["asan"].split(" on ")[0], "frames": [], "stacked": False})
+            elif match["leak"] is not None:
+                errors.append({"what": match["leak"], "frames": [], "stacked": False})
+            elif match["ubsan"] is not None:
+                # UndefinedBehaviorSanitizer names the location of the error before its stack trace (if any)
+                errors.append({"what": match["ubsan"], "frames": [(match["file"], match["line"])], "stacked": False})
+            continue
+
+        if not errors:
+            continue
+        error = errors[-1]
+
+        access = _SANITIZER_ACCESS.match(line)
+        if access and not error["frames"]:
+            error["what"] += f" ({access.group(1).lower()} of size {access.group(2)})"
+            continue
+
+        # Only the first stack trace of an error is that of the error itself
+        frame = _SANITIZER_FRAME.fullmatch(line)
+        if frame and not error["stacked"]:
+            if frame["file"]:
+                error["frames"].append((frame["file"], frame["line"]))
+        elif error["frames"]:
+            error["stacked"] = True
+
+    for error in errors:
+        msg = ["\t", error["what"]]
+
+        # Find first stack frame within student's code.
+        for file, line in error["frames"]:
+            file = _student_file(file)
+            if file:
+                msg.append(f": ({_('file')}: {file}, {_('line')}: {line})")
+                break
+
+        yield "".join(msg)
+
+
+def _student_file(file):
+    """
+    The path within the student's code (i.e., run_dir) of file as named in a sanitizer's report, or None.
+    A file is named by the directory it was compiled in, which differs from run_dir if the program was
+    restored from the compile cache, so this is the longest trailing part of file's path that exists in run_dir.
+    """
+    if internal.run_dir is None:
+        return None
+
+    parts = Path(file).parts
+    for i in range(len(parts)):
+        path = Path(*parts[i:])
+        if not path.is_absolute() and ".." not in path.parts and (Path(internal.run_dir) / path).is_file():
+            return str(path)
+    return None
 
 
 def _check_valgrind(xml_file):
     """Log and report any errors encountered by valgrind."""
     log(_("checking for valgrind errors..."))
 
-    # Load XML file created by valgrind
-    xml = ET.ElementTree(file=xml_file)
-
     # Ensure that we don't get duplicate error messages.
     reported = set()
-    for error in xml.iterfind("error"):
+    for error in _valgrind_errors(xml_file):
         # Type of error valgrind encountered
         kind = error.find("kind").text
 
@@ -132,9 +661,35 @@ def _check_valgrind(xml_file):
 
         msg = "".join(msg)
         if msg not in reported:
+            # No need to look any further once there are more errors than anyone would read
+            if len(reported) == _MAX_VALGRIND_ERRORS:
+                log(_("and more errors, of which only the first {} are shown").format(_MAX_VALGRIND_ERRORS))
+                break
             log(msg)
             reported.add(msg)
 
     # Only raise exception if we encountered errors.
     if reported:
         raise Failure(_("valgrind tests failed; see log for more information."))
+
+
+# Maximum number of distinct errors of valgrind logged by _check_valgrind
+_MAX_VALGRIND_ERRORS = 50
+
+
+def _valgrind_errors(xml_file):
+    """
+    Yield each error in valgrind's XML output xml_file. The file is parsed incrementally, and each error
+    is cleared once done with, so that a report of any size takes little memory.
+    """
+    parsed = False
+    try:
+        for _event, element in ET.iterparse(xml_file):
+            parsed = True
+            if element.tag == "error":
+                yield element
+                element.clear()
+    except ET.ParseError:
+        # The output of valgrind ends early if it was killed (e.g. along with a program that timed out)
+        if not parsed:
+            raise
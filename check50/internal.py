@@ -11,7 +11,7 @@ import traceback
 
 import lib50
 
-from . import _simple, _exceptions
+from . import _simple, _exceptions, _limits
 
 #: Directory containing the check and its associated files
 check_dir = None
@@ -31,6 +31,20 @@ check_running = False
 #: The user specified slug used to indentifies the set of checks
 slug = None
 
+#: Resource limits of every process started by :class:`check50.run`, see ``limits`` in ``.cs50.yaml``
+limits = {}
+
+#: Boolean that indicates if check50 records transcripts of the processes checks run, see ``check50 --record``
+recording = False
+
+#: Directories of the checks (and other files) imported with :func:`check50.import_checks` and :func:`import_file`,
+#: which the checks in check_dir depend on
+imported_dirs = set()
+
+#: Semaphore shared by the processes of all checks, that bounds how many compilers :func:`check50.c.compile` runs
+#: at once on top of the one each compilation runs at a time
+compile_slots = None
+
 #: ``lib50`` config loader
 CONFIG_LOADER = lib50.config.Loader("check50")
 CONFIG_LOADER.scope("files", "include", "exclude", "require")
@@ -46,14 +60,16 @@ class Register:
         self._after_everies = []
         self._after_checks = []
 
-    def after_check(self, func):
+    def after_check(self, func, on_failure=False):
         """Run func once at the end of the check, then discard func.
 
         :param func: callback to run after check
+        :param on_failure: whether to run func also if the check failed (e.g. to log what went wrong), \
+                           in which case a :class:`check50.Failure` that func raises is ignored
         :raises check50.internal.Error: if called when no check is being run"""
         if not check_running:
             raise _exceptions.Error("cannot register callback to run after check when no check is running")
-        self._after_checks.append(func)
+        self._after_checks.append((func, on_failure))
 
     def after_every(self, func):
         """Run func at the end of every check.
@@ -79,13 +95,22 @@ class Register:
             f()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        # Only run 'afters' when check has passed
+        # Only run 'afters' when check has passed, but for those registered to run regardless
         if exc_type is not None:
+            from ._api import Failure
+
+            after_checks, self._after_checks = self._after_checks, []
+            for func, on_failure in reversed(after_checks):
+                if on_failure:
+                    try:
+                        func()
+                    except Failure:
+                        pass
             return
 
         # Run and remove all checks registered to run after a single check
         while self._after_checks:
-            self._after_checks.pop()()
+            self._after_checks.pop()[0]()
 
         for f in self._after_everies:
             f()
@@ -109,7 +134,9 @@ def load_config(check_dir):
     options = {
         "checks": "__init__.py",
         "dependencies": None,
-        "translations": None
+        "translations": None,
+        "fresh_import": False,
+        "limits": {}
     }
 
     # Defaults for translation keys
@@ -141,6 +168,12 @@ def load_config(check_dir):
             translation_options.update(options["translations"])
         options["translations"] = translation_options
 
+    # Validate resource limits
+    try:
+        options["limits"] = _limits.validate(options["limits"] or {})
+    except ValueError as e:
+        raise _exceptions.Error(_("Invalid limits in .cs50.yaml: {}").format(e))
+
     return options
 
 
@@ -180,6 +213,7 @@ def import_file(name, path):
     :param path: Path to Python file
     :type path: str / Path
     """
+    imported_dirs.add(Path(path).resolve().parent)
     spec = importlib.util.spec_from_file_location(name, path)
     mod = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(mod)
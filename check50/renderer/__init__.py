@@ -1 +1 @@
-from ._renderers import to_ansi, to_html, to_json
+from ._renderers import to_ansi, to_html, to_json, to_ndjson, to_ndjson_summary
@@ -21,7 +21,41 @@ def to_html(slug, results, version):
 
 
 def to_json(slug, results, version):
-    return json.dumps({"slug": slug, "results": results, "version": version}, indent=4)
+    return json.dumps({"slug": slug, "results": results, "resources": _total_resources(results), "version": version}, indent=4)
+
+
+def to_ndjson(slug, results, version):
+    lines = [json.dumps(result) for result in results]
+    lines.append(to_ndjson_summary(slug, results, version))
+    return "\n".join(lines)
+
+
+def to_ndjson_summary(slug, results, version):
+    summary = {
+        "passed": sum(result["passed"] is True for result in results),
+        "failed": sum(result["passed"] is False for result in results),
+        "skipped": sum(result["passed"] is None for result in results)
+    }
+    return json.dumps({"slug": slug, "summary": summary, "version": version})
+
+
+def _total_resources(results):
+    """Resources used by all results combined: the sum of their times, and the maximum of their peak RSS."""
+    totals = {"time": 0, "cpu_user": 0, "cpu_system": 0, "max_rss": 0,
+              "children": {"cpu_user": 0, "cpu_system": 0, "max_rss": 0}}
+
+    for result in results:
+        totals["time"] += result.get("time") or 0
+        resources = result.get("resources")
+        if not resources:
+            continue
+
+        for total, usage in ((totals, resources), (totals["children"], resources["children"])):
+            total["cpu_user"] += usage["cpu_user"]
+            total["cpu_system"] += usage["cpu_system"]
+            total["max_rss"] = max(total["max_rss"], usage["max_rss"])
+
+    return totals
 
 
 def to_ansi(slug, results, version, _log=False):
@@ -1,8 +1,10 @@
 import collections
 from contextlib import contextmanager
 import concurrent.futures as futures
+import copy
 import enum
 import functools
+import heapq
 import inspect
 import importlib
 import gettext
@@ -10,17 +12,22 @@ import multiprocessing
 import os
 from pathlib import Path
 import pickle
+import resource
 import shutil
 import signal
 import sys
+import tarfile
 import tempfile
+import time
 import traceback
+import zipfile
 
 import attr
 import lib50
 
-from . import internal, _exceptions, __version__
-from ._api import log, Failure, _copy, _log, _data
+from . import internal, _exceptions, _transcripts, _workspace, __version__
+from ._api import log, Failure, _copy, _log, _data, _max_rss, _processes, _kill_processes
+from .contextmanagers import nullcontext
 
 _check_names = []
 
@@ -35,6 +42,8 @@ class CheckResult:
     cause = attr.ib(default=None)
     data = attr.ib(default=attr.Factory(dict))
     dependency = attr.ib(default=None)
+    time = attr.ib(default=None)
+    resources = attr.ib(default=None)
 
     @classmethod
     def from_check(cls, check, *args, **kwargs):
@@ -73,26 +82,37 @@ def _timeout(seconds):
     """
 
     def _handle_timeout(*args):
+        # Stop every process the code block started straight away, rather than once the code block unwinds
+        for process in _processes:
+            process._kill_group()
         raise Timeout(seconds)
 
     signal.signal(signal.SIGALRM, _handle_timeout)
-    signal.alarm(seconds)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
     try:
         yield
     finally:
-        signal.alarm(0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
         signal.signal(signal.SIGALRM, signal.SIG_DFL)
 
 
-def check(dependency=None, timeout=60, max_log_lines=100):
+def check(dependency=None, timeout=60, max_log_lines=100, cache=True, replay=False):
     """Mark function as a check.
 
     :param dependency: the check that this check depends on
     :type dependency: function
-    :param timeout: maximum number of seconds the check can run
-    :type timeout: int
+    :param timeout: maximum number of seconds the check can run, processes started by the check \
+                    (via :func:`check50.run`) are killed as soon as this timeout expires
+    :type timeout: int / float
     :param max_log_lines: maximum number of lines that can appear in the log
     :type max_log_lines: int
+    :param cache: whether check50 may reuse the result of this check (if it passed) from an earlier run \
+                  in which nothing the check depends on was different. Set to ``False`` for checks \
+                  whose outcome may differ between runs, such as randomized or time-dependent checks.
+    :type cache: bool
+    :param replay: whether to replay the transcripts recorded for this check (with ``check50 --record``) \
+                   against the student's programs, instead of running the check itself, see below
+    :type replay: bool
 
     When a check depends on another, the former will only run if the latter passes.
     Additionally, the dependent check will inherit the filesystem of its dependency.
@@ -120,6 +140,21 @@ def check(dependency=None, timeout=60, max_log_lines=100):
             # Since 'prints_hello', depends on 'compiles' it inherits the compiled binary
             check50.run("./hello").stdout("[Hh]ello, world!?\\n", "hello, world\\n").exit()
 
+    Running ``check50 --dev --record path/to/checks/transcripts.json path/to/checks`` in a directory with a
+    reference solution runs all checks, and records every process they start with :func:`check50.run`: its
+    command, its input, its output and its exit code. These transcripts are stored in the file given to
+    ``--record``, which check50 looks for as ``transcripts.json`` in the checks directory. A check with
+    ``replay=True`` then first starts each of its recorded commands at once, sends each all of its recorded
+    input without waiting for prompts, and compares all of its output and exit code to the reference solution's.
+    If all of it is the same, the check passes right away. Otherwise, the check runs itself after all, with
+    half of its timeout left.
+    Only checks that do nothing but run programs (and whose dependents need no state) should be replayed::
+
+        @check50.check(compiles, replay=True)
+        def test_change():
+            \"""gives the right change for many amounts\"""
+            for amount in ("0.41", "0.01", "0.15", "1.6", "23"):
+                check50.run("./cash").stdin(amount).exit(0)
     """
     def decorator(check):
 
@@ -127,6 +162,8 @@ def check(dependency=None, timeout=60, max_log_lines=100):
         # contain the names of the checks in the order in which they are declared
         _check_names.append(check.__name__)
         check._check_dependency = dependency
+        check._check_cache = cache
+        check._check_replay = replay
 
         @functools.wraps(check)
         def wrapper(run_root_dir, dependency_state):
@@ -135,17 +172,32 @@ def check(dependency=None, timeout=60, max_log_lines=100):
             # Any shared (returned) state
             state = None
 
+            start = time.perf_counter()
+            usage = _Usage()
             try:
-                # Setup check environment, copying disk state from dependency
+                # Setup check environment, cloning (copy-on-write) disk state from dependency
                 internal.run_dir = run_root_dir / check.__name__
                 src_dir = run_root_dir / (dependency.__name__ if dependency else "-")
-                shutil.copytree(src_dir, internal.run_dir)
+                _workspace.clone_tree(src_dir, internal.run_dir)
                 os.chdir(internal.run_dir)
 
                 # Run registered functions before/after running check and set timeout
                 with internal.register, _timeout(seconds=timeout):
-                    args = (dependency_state,) if inspect.getfullargspec(check).args else ()
-                    state = check(*args)
+                    transcripts = _transcripts.load(check.__name__) if replay and not internal.recording else None
+                    replayed = False
+                    if transcripts:
+                        # Leave the check itself half of its time, in case the replay does not pass
+                        replayed = _transcripts.replay(transcripts, timeout / 2)
+                        if not replayed:
+                            # Start over from the dependency's files, whatever the replayed programs did to them
+                            os.chdir(run_root_dir)
+                            shutil.rmtree(internal.run_dir)
+                            _workspace.clone_tree(src_dir, internal.run_dir)
+                            os.chdir(internal.run_dir)
+
+                    if not replayed:
+                        args = (dependency_state,) if inspect.getfullargspec(check).args else ()
+                        state = check(*args)
             except Failure as e:
                 result.passed = False
                 result.cause = e.payload
@@ -163,21 +215,37 @@ def check(dependency=None, timeout=60, max_log_lines=100):
             finally:
                 result.log = _log if len(_log) <= max_log_lines else ["..."] + _log[-max_log_lines:]
                 result.data = _data
+                # Don't leave any processes behind that outlive the check
+                _kill_processes()
+                if internal.recording:
+                    _transcripts.save(check.__name__)
+                result.time = time.perf_counter() - start
+                result.resources = usage.stop()
                 return result, state
         return wrapper
     return decorator
 
 
 class CheckRunner:
-    def __init__(self, checks_path, included_files):
+    def __init__(self, checks_path, included_files, fresh_import=False, timings=None, cache=None):
         self.checks_path = checks_path
         self.included_files = included_files
+        self.fresh_import = fresh_import
+        self.timings = timings
+        self.cache = cache
 
-    def run(self, targets=None):
+        # TODO: Naming the module "checks" is arbitrary. Better name?
+        self.checks_spec = importlib.util.spec_from_file_location("checks", checks_path)
+
+        # Pool of workers shared between runs, see CheckRunner.shared_workers
+        self._executor = None
+
+    def run(self, targets=None, on_result=None):
         """
         Run checks concurrently.
         Returns a list of CheckResults ordered by declaration order of the checks in the imported module
         targets allows you to limit which checks run. If targets is false-y, all checks are run.
+        on_result is called with each CheckResult (including those of skipped checks) as soon as it is known.
         """
         graph = self.build_subgraph(targets) if targets else self.dependency_graph
 
@@ -185,38 +253,166 @@ class CheckRunner:
         # NOTE: Requires CPython 3.6. If we need to support older versions of Python, replace with OrderedDict.
         results = {name: None for name in self.check_names}
 
-        try:
-            max_workers = int(os.environ.get("CHECK50_WORKERS"))
-        except (ValueError, TypeError):
-            max_workers = None
+        # Never have more checks in flight than there are workers to run them
+        max_workers = _max_workers()
+
+        # Dispatch ready checks with the longest remaining path of dependents first,
+        # breaking ties by declaration order
+        priorities = self.critical_paths(graph, self.timings.expected() if self.timings else None)
+        order = {name: i for i, name in enumerate(self.check_names)}
+        ready = []
+
+        # Cache keys of checks whose result may be cached, None for those that may not
+        keys = {None: self.cache.submission_key(internal.run_root_dir / "-") if self.cache else None}
+        cached = set()
+
+        def report(result):
+            results[result.name] = result
+            if on_result:
+                on_result(result)
+
+        def make_ready(names, dependency=None, state=None):
+            for name in names:
+                # A result can only be cached if the results of all of its dependencies can be
+                keys[name] = self.cache.key(name, keys[dependency]) if keys[dependency] and self.cacheable[name] else None
+                hit = self.cache.load(keys[name], internal.run_root_dir / name) if keys[name] else None
+                if hit:
+                    result, cached_state = hit
+                    cached.add(name)
+                    report(result)
+                    make_ready(graph[name], name, cached_state)
+                else:
+                    heapq.heappush(ready, (-priorities[name], order[name], name, state))
+
+        with nullcontext(self._executor) if self._executor else self._create_executor() as executor:
+            # Start with all checks that have no dependencies
+            make_ready(graph[None])
+            not_done = set()
+
+            while ready or not_done:
+                while ready and len(not_done) < max_workers:
+                    _priority, _order, name, state = heapq.heappop(ready)
+                    # Workers received all other cross-process attributes upon starting, see _create_executor
+                    not_done.add(executor.submit(run_check(name, self.checks_spec, state, cross_process=False)))
 
-        with futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-            # Start all checks that have no dependencies
-            not_done = set(executor.submit(run_check(name, self.checks_spec))
-                           for name in graph[None])
-            not_passed = []
-
-            while not_done:
                 done, not_done = futures.wait(not_done, return_when=futures.FIRST_COMPLETED)
                 for future in done:
                     # Get result from completed check
                     result, state = future.result()
-                    results[result.name] = result
+                    report(result)
                     if result.passed:
-                        # Dispatch dependent checks
-                        for child_name in graph[result.name]:
-                            not_done.add(executor.submit(
-                                run_check(child_name, self.checks_spec, state)))
+                        if keys[result.name]:
+                            self.cache.store(keys[result.name], result, state, internal.run_root_dir / result.name)
+
+                        # Dependent checks are now ready to be dispatched
+                        make_ready(graph[result.name], result.name, state)
                     else:
-                        not_passed.append(result.name)
+                        self._skip_children(result.name, results, report)
+
+        if self.timings:
+            self.timings.record(result for name, result in results.items() if result and name not in cached)
+            self.timings.save()
 
-        for name in not_passed:
-            self._skip_children(name, results)
+        if self.cache:
+            self.cache.evict()
 
         # Don't include checks we don't have results for (i.e. in the case that targets != None) in the list.
         return list(filter(None, results.values()))
 
 
+    def run_batch(self, submissions, files=None, targets=None):
+        """
+        Run checks against each of submissions, sharing one pool of workers (each of which
+        imports the checks module just once) between all of them.
+        submissions are directories, or archives that can be unpacked by shutil.unpack_archive.
+        files is the ``files`` configuration of the checks, deciding which files of a submission to include.
+        Yields a (submission, results) tuple per submission, in order, where results is either a list of
+        CheckResults or the error that prevented the submission from being checked (e.g. missing files).
+        """
+        with self.shared_workers():
+            for submission in submissions:
+                try:
+                    with _unpacked(submission) as submission_dir, lib50.cd(submission_dir):
+                        self.included_files = lib50.files(files)[0]
+                        with self:
+                            results = self.run(targets)
+                except (lib50.Error, _exceptions.Error) as e:
+                    results = e
+                except futures.process.BrokenProcessPool:
+                    # A worker died (e.g. killed for running out of memory), which leaves the pool unusable
+                    results = _exceptions.Error(_("a worker crashed while checking {}").format(submission))
+                    self._executor.shutdown(wait=False)
+                    self._executor = self._create_executor()
+                yield submission, results
+
+
+    @contextmanager
+    def shared_workers(self):
+        """Context manager within which all runs share one pool of workers, rather than starting a pool per run."""
+        # Not a with statement, as run_batch replaces a pool that broke
+        self._executor = self._create_executor()
+        try:
+            yield self
+        finally:
+            self._executor.shutdown()
+            self._executor = None
+
+
+    def _create_executor(self):
+        """Create a pool of workers to run the checks in."""
+        context = multiprocessing.get_context(_start_method())
+
+        # Have the forkserver import check50's runtime once, such that every worker forks with it loaded
+        if context.get_start_method() == "forkserver":
+            context.set_forkserver_preload(list(FORKSERVER_PRELOAD))
+
+        # Send the cross-process attributes to each worker once, rather than along with every check.
+        # Unless the checks need a fresh import for every check, have each worker import them just once too
+        worker = run_check(None, self.checks_spec)
+        initializer = worker.set_attributes if self.fresh_import else worker.preload
+
+        # Each check compiles one file at a time, and all of them together as many more as there are CPUs.
+        # A semaphore can only be sent to a worker as it starts, so along with the initializer
+        worker.compile_slots = context.BoundedSemaphore(os.cpu_count() or 1)
+        return futures.ProcessPoolExecutor(max_workers=_max_workers(), mp_context=context, initializer=initializer)
+
+
+    def expected_duration(self, targets=None):
+        """
+        Predict how long (in seconds) running the checks will take, given enough workers,
+        based on the timing history of the checks. Returns None if there is no history.
+        """
+        durations = self.timings.expected() if self.timings else None
+        if not durations:
+            return None
+
+        graph = self.build_subgraph(targets) if targets else self.dependency_graph
+        lengths = self.critical_paths(graph, durations)
+        return max((lengths[name] for name in graph[None]), default=0)
+
+
+    def critical_paths(self, graph, durations=None):
+        """
+        Map each check in graph to the length of the longest path of checks starting at it,
+        that is the check's own (expected) duration plus that of its longest chain of dependents.
+        durations maps check names to expected durations in seconds, any check not in durations counts as 1.
+        """
+        durations = durations or {}
+        lengths = {}
+
+        def length(name):
+            if name not in lengths:
+                children = graph.get(name, ())
+                lengths[name] = durations.get(name, 1) + max((length(child) for child in children), default=0)
+            return lengths[name]
+
+        for children in list(graph.values()):
+            for name in children:
+                length(name)
+
+        return lengths
+
+
     def build_subgraph(self, targets):
         """
         Build minimal subgraph of self.dependency_graph that contains each check in targets
@@ -257,10 +453,10 @@ class CheckRunner:
         return inverse_dependency_graph
 
 
-    def _skip_children(self, check_name, results):
+    def _skip_children(self, check_name, results, report=None):
         """
         Recursively skip the children of check_name (presumably because check_name
-        did not pass).
+        did not pass). Each skipped result is passed to report, if given.
         """
         for name in self.dependency_graph[check_name]:
             if results[name] is None:
@@ -268,7 +464,9 @@ class CheckRunner:
                                             passed=None,
                                             dependency=check_name,
                                             cause={"rationale": _("can't check until a frown turns upside down")})
-                self._skip_children(name, results)
+                if report:
+                    report(results[name])
+                self._skip_children(name, results, report)
 
 
     def __enter__(self):
@@ -283,9 +481,15 @@ class CheckRunner:
         self._cd_manager = lib50.cd(internal.run_root_dir)
         self._cd_manager.__enter__()
 
-        # TODO: Naming the module "checks" is arbitrary. Better name?
-        self.checks_spec = importlib.util.spec_from_file_location("checks", self.checks_path)
+        # Only import the checks once, even if this runner is entered once per submission
+        if not hasattr(self, "check_names"):
+            self._load_checks()
+
+        return self
 
+
+    def _load_checks(self):
+        """Import the checks module and build the dependency graph of its checks."""
         # Clear check_names, import module, then save check_names. Not thread safe.
         # Ideally, there'd be a better way to extract declaration order than @check mutating global state,
         # but there are a lot of subtleties with using `inspect` or similar here
@@ -307,7 +511,8 @@ class CheckRunner:
         # Map each check name to its description
         self.check_descriptions = {name: check.__doc__ for name, check in checks}
 
-        return self
+        # Map each check name to whether its result may be cached
+        self.cacheable = {name: check._check_cache for name, check in checks}
 
 
     def __exit__(self, type, value, tb):
@@ -318,6 +523,23 @@ class CheckRunner:
         self._cd_manager.__exit__(type, value, tb)
 
 
+#: Modules the forkserver imports before forking any worker, such that no worker imports these from scratch
+FORKSERVER_PRELOAD = (
+    "check50",
+    "check50.runner",
+    "check50.c",
+    "check50.py",
+    "check50.flask",
+    "check50.internal",
+    "check50.regex",
+    "pexpect",
+    "lib50",
+    "attr",
+    "jinja2",
+    "yaml"
+)
+
+
 class run_check:
     """
     Check job that runs in a separate process.
@@ -332,24 +554,33 @@ class run_check:
         "internal.slug",
         "internal.student_dir",
         "internal.run_root_dir",
+        "internal.limits",
+        "internal.recording",
         "sys.excepthook",
         "__version__"
     )
 
-    def __init__(self, check_name, spec, state=None):
+    def __init__(self, check_name, spec, state=None, cross_process=True):
         self.check_name = check_name
         self.spec = spec
         self.state = state
-        self._store_attributes()
+
+        # Directories of this particular run, which may change between runs sharing one pool of workers
+        self.student_dir = internal.student_dir
+        self.run_root_dir = internal.run_root_dir
+
+        # Leave out the cross-process attributes if the process running this job has them already
+        if cross_process:
+            self._store_attributes()
 
     def _store_attributes(self):
         """"
         Store all values from the attributes from run_check.CROSS_PROCESS_ATTRIBUTES on this object,
-        in case multiprocessing is using spawn as its starting method. 
+        in case multiprocessing is using spawn (or forkserver) as its starting method.
         """
 
-        # Attributes only need to be passed explicitly to child processes when using spawn
-        if multiprocessing.get_start_method() != "spawn":
+        # Attributes only need to be passed explicitly to child processes that are not forked from this one
+        if _start_method() not in ("spawn", "forkserver"):
            return
 
         self._attribute_values = [eval(name) for name in self.CROSS_PROCESS_ATTRIBUTES]
@@ -366,11 +597,14 @@ class run_check:
         self._attribute_values = tuple(self._attribute_values)
 
 
-    def _set_attributes(self):
+    def set_attributes(self):
         """
-        If the parent process set any values in self._attribute_values, 
+        If the parent process set any values in self._attribute_values,
         restore them in the child process.
         """
+        if getattr(self, "compile_slots", None) is not None:
+            internal.compile_slots = self.compile_slots
+
         if not hasattr(self, "_attribute_values"):
            return
 
@@ -390,19 +624,217 @@ class run_check:
         setattr(obj, parts[-1], value)
 
 
-    def __call__(self):
-        # Restore any attributes from the parent process
-        self._set_attributes()
+    def preload(self):
+        """
+        Import the checks module once in this (worker) process, and cache it for all subsequent
+        checks run by this process. Meant to be used as the initializer of each worker.
+        """
+        self.set_attributes()
+        mod = self._import_checks()
+        _checks_modules[self.spec.origin] = (mod, _snapshot(vars(mod)))
 
-        # Create the checks module
-        mod = importlib.util.module_from_spec(self.spec)
 
-        # Execute (effectively import) the checks module
+    def _import_checks(self):
+        """Create and execute (effectively import) the checks module."""
+        mod = importlib.util.module_from_spec(self.spec)
         self.spec.loader.exec_module(mod)
 
+        # Declaration order is only of interest to the main process
+        _check_names.clear()
+        return mod
+
+
+    def __call__(self):
+        # Restore any attributes from the parent process
+        self.set_attributes()
+        internal.student_dir = self.student_dir
+        internal.run_root_dir = self.run_root_dir
+
+        # Reuse the checks module if this worker imported it already, resetting its global state
+        try:
+            mod, snapshot = _checks_modules[self.spec.origin]
+        except KeyError:
+            mod = self._import_checks()
+        else:
+            _restore(vars(mod), snapshot)
+
         # Run just the check named self.check_name
         internal.check_running = True
         try:
             return getattr(mod, self.check_name)(internal.run_root_dir, self.state)
         finally:
             internal.check_running = False
+
+
+class _Usage:
+    """
+    Measure the CPU time and peak memory (RSS) used by this process and by all of its child processes
+    (e.g. those started by check50.run) from construction until stop is called.
+    """
+
+    # ru_maxrss is in bytes on macOS, but in kilobytes elsewhere
+    RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+    def __init__(self):
+        # Reset this process's peak RSS (Linux only), such that it reflects just this check
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+        self._self = resource.getrusage(resource.RUSAGE_SELF)
+        self._children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    def stop(self):
+        """Return a dict with the resources used since construction."""
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        # ru_maxrss of children is the peak of any child ever waited for by this process,
+        # so it only says something about this check's children if it grew
+        children_max_rss = [rss * self.RSS_UNIT for rss in _max_rss]
+        if children_usage.ru_maxrss > self._children.ru_maxrss:
+            children_max_rss.append(children_usage.ru_maxrss * self.RSS_UNIT)
+
+        return {
+            "cpu_user": self_usage.ru_utime - self._self.ru_utime,
+            "cpu_system": self_usage.ru_stime - self._self.ru_stime,
+            "max_rss": self._peak_rss(self_usage),
+            "children": {
+                "cpu_user": children_usage.ru_utime - self._children.ru_utime,
+                "cpu_system": children_usage.ru_stime - self._children.ru_stime,
+                "max_rss": max(children_max_rss, default=0)
+            }
+        }
+
+    def _peak_rss(self, usage):
+        """Peak RSS of this process in bytes, since construction where the platform allows for it."""
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return usage.ru_maxrss * self.RSS_UNIT
+
+
+def _start_method():
+    """
+    Start method of the processes that run checks (fork, spawn or forkserver),
+    CHECK50_START_METHOD if set to a method available on this platform, or else multiprocessing's default.
+    """
+    start_method = os.environ.get("CHECK50_START_METHOD")
+    if start_method in multiprocessing.get_all_start_methods():
+        return start_method
+    return multiprocessing.get_start_method()
+
+
+def _max_workers():
+    """
+    Number of workers to run checks with, CHECK50_WORKERS if set or else the number of CPUs.
+
+    :raises check50.internal.Error: if CHECK50_WORKERS is set to anything but a positive number
+    """
+    workers = os.environ.get("CHECK50_WORKERS")
+    if workers is None:
+        return os.cpu_count() or 1
+
+    try:
+        max_workers = int(workers)
+    except ValueError:
+        max_workers = 0
+    if max_workers < 1:
+        raise _exceptions.Error(_("CHECK50_WORKERS must be a positive number of workers, not {}").format(workers))
+    return max_workers
+
+
+@contextmanager
+def _unpacked(submission):
+    """
+    Context manager yielding the directory containing submission. If submission is an archive,
+    it is unpacked into a temporary directory first. If that yields just one directory, that directory is used.
+    """
+    if not os.path.exists(submission):
+        raise _exceptions.Error(_("{} not found").format(submission))
+
+    if os.path.isdir(submission):
+        yield Path(submission).resolve()
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            _check_members(submission)
+
+            # Have tarfile itself refuse anything unsafe too, where it can (some versions take filter for tar files only)
+            if tarfile.is_tarfile(submission) and "filter" in inspect.signature(shutil.unpack_archive).parameters:
+                shutil.unpack_archive(submission, directory, filter="data")
+            else:
+                shutil.unpack_archive(submission, directory)
+        except (shutil.ReadError, ValueError, tarfile.TarError, zipfile.BadZipFile, OSError):
+            raise _exceptions.Error(_("could not unpack {}").format(submission))
+
+        entries = list(Path(directory).iterdir())
+        yield entries[0] if len(entries) == 1 and entries[0].is_dir() else Path(directory)
+
+
+def _check_members(archive):
+    """
+    Ensure that unpacking archive creates nothing but files, directories and links within the directory unpacked into.
+
+    :raises ValueError: if any member of archive is an absolute path, leads out of the directory (e.g. by ``..``
+                        or by a link), or is a special file such as a device
+    """
+    def escapes(name):
+        return os.path.isabs(name) or os.path.normpath(name).split(os.sep)[0] == ".."
+
+    if tarfile.is_tarfile(archive):
+        with tarfile.open(archive) as tar:
+            for member in tar.getmembers():
+                names = [member.name]
+                if member.issym():
+                    names.append(os.path.join(os.path.dirname(member.name), member.linkname))
+                elif member.islnk():
+                    names.append(member.linkname)
+
+                if not (member.isfile() or member.isdir() or member.issym() or member.islnk()) or any(map(escapes, names)):
+                    raise ValueError(f"unsafe member {member.name}")
+
+    elif zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zip_file:
+            for name in zip_file.namelist():
+                if escapes(name):
+                    raise ValueError(f"unsafe member {name}")
+
+
+# Checks modules preloaded by this (worker) process, mapping spec.origin to (module, snapshot of its globals)
+_checks_modules = {}
+
+# Types of module-level values that are copied, rather than shared, between checks run by one worker
+_MUTABLE_TYPES = (list, dict, set, bytearray)
+
+
+def _copy_value(value):
+    """Deep copy value if it is a builtin mutable container, otherwise return value itself."""
+    if type(value) not in _MUTABLE_TYPES:
+        return value
+
+    try:
+        return copy.deepcopy(value)
+    except Exception:
+        return value
+
+
+def _snapshot(namespace):
+    """Take a snapshot of a module's namespace, such that it can later be reset via _restore."""
+    return {name: _copy_value(value) for name, value in namespace.items()}
+
+
+def _restore(namespace, snapshot):
+    """
+    Reset a module's namespace to snapshot (in place, so that the globals of its functions are reset too).
+    Any names bound since are removed, and any mutable containers are replaced by fresh copies.
+    """
+    namespace.clear()
+    namespace.update(_snapshot(snapshot))
@@ -1,11 +1,14 @@
+import asyncio
 import unittest
 import os
 import pathlib
 import shutil
 import sys
 import tempfile
+import time
 
 import check50
+import check50._proc
 import check50.internal
 
 
@@ -120,6 +123,55 @@ class TestProcessStdin(Base):
         self.process.stdin("bar", prompt=False)
         self.assertTrue(self.process.process.isalive())
 
+    def test_prompt_in_parts(self):
+        self.write("import time\nprint('a', end='', flush=True)\ntime.sleep(.05)\nprint('b', end='', flush=True)\nprint(input())")
+        self.runpy()
+        self.process.stdin("c")
+        self.assertEqual(self.process.stdout(), "c\n")
+
+    def test_many_prompts(self):
+        self.write("for i in range(10):\n    input(f'{i}: ')\nprint('done')")
+        self.runpy()
+        for i in range(10):
+            self.process.stdin(str(i))
+        self.assertEqual(self.process.stdout(), "done\n")
+
+    @unittest.skipUnless(sys.platform == "linux", "requires /proc")
+    def test_waiting_for_input(self):
+        self.write("import time\ntime.sleep(.5)\ninput()")
+        self.runpy()
+        self.assertFalse(check50._proc.waiting_for_input(self.process.process.pid))
+        time.sleep(1)
+        self.assertTrue(check50._proc.waiting_for_input(self.process.process.pid))
+
+    @unittest.skipUnless(sys.platform == "linux", "requires /proc")
+    def test_pipeline_busy(self):
+        # The first program of the pipeline waits for input, while the second still works on its output
+        self.process = check50.run("python3 -c 'input()' | python3 -c 'while True: pass'")
+        time.sleep(.5)
+        self.assertFalse(check50._proc.waiting_for_input(self.process.process.pid))
+
+    @unittest.skipUnless(sys.platform == "linux", "requires /proc")
+    def test_thread_busy(self):
+        self.write("import threading\nthreading.Thread(target=lambda: print(sum(range(10**8)))).start()\ninput()")
+        self.runpy()
+        time.sleep(.5)
+        self.assertFalse(check50._proc.waiting_for_input(self.process.process.pid))
+
+    @unittest.skipUnless(sys.platform == "linux", "requires /proc")
+    def test_unread_input(self):
+        self.write("import os, signal\nos.kill(os.getpid(), signal.SIGSTOP)\ninput()")
+        self.runpy()
+        self.process.stdin("foo", prompt=False)
+        time.sleep(.5)
+        # Stopped, with input left to read
+        self.assertFalse(check50._proc.waiting_for_input(self.process.process.pid))
+
+    def test_pipeline_output(self):
+        # The first program of the pipeline waits for input all along, so the output is yet to come
+        self.process = check50.run("python3 -c 'input()' | python3 -c 'sum(range(10**7)); print(\"bar\")'")
+        self.process.stdout("bar", timeout=5)
+
 class TestProcessStdout(Base):
     def test_no_out(self):
         self.runpy()
@@ -258,6 +310,161 @@ class TestProcessStdoutFile(Base):
         with open(self.txt_filename, "r") as f:
             self.process.stdout(f)
 
+class TestProcessStdoutMany(Base):
+    def test_all(self):
+        self.write("print('foo')\nprint('bar')\nprint('baz')\n")
+        self.runpy()
+        self.process.stdout_all(["bar", "foo"])
+        self.assertEqual(self.process.stdout(), "baz\n")
+
+    def test_all_missing(self):
+        self.write("print('foo')\nprint('bar')\n")
+        self.runpy()
+        with self.assertRaises(check50.Missing) as cm:
+            self.process.stdout_all(["foo", "qux", "quux"], timeout=1)
+        self.assertEqual(cm.exception.payload["missing_item"], "qux, quux")
+        self.assertEqual(self.process.stdout(), "foo\nbar\n")
+
+    def test_any(self):
+        self.write("print('foo')\nprint('bar')\n")
+        self.runpy()
+        self.process.stdout_any(["bar", "qux", "foo"])
+        self.assertEqual(self.process.stdout(), "bar\n")
+
+        self.runpy()
+        with self.assertRaises(check50.Missing):
+            self.process.stdout_any(["qux", "quux"], timeout=1)
+
+    def test_numbers_and_regex(self):
+        self.write("print('1.0 + 21 = a.c')\n")
+        self.runpy()
+        self.process.stdout_all([21, 1.0, "a.c"], regex=False)
+
+        self.runpy()
+        with self.assertRaises(check50.Missing):
+            self.process.stdout_all([1, "a\\.c"], regex=False, timeout=1)
+
+    def test_after_input(self):
+        self.write("x = input()\nprint(x * 2)\nprint('done')\n")
+        self.runpy()
+        self.process.stdin("ab", prompt=False)
+        self.process.stdout_all(["done", "abab"]).exit(0)
+
+
+class TestRunAsync(Base):
+    def test_interaction(self):
+        self.write("x = input('x: ')\nprint(x * 2)\nprint('done')\n")
+
+        async def main():
+            process = check50.run_async(f"python3 ./{self.filename}")
+            await process.stdin("ab")
+            await process.stdout("abab\n")
+            await process.stdout_all(["done"])
+            return await process.exit()
+
+        self.assertEqual(asyncio.run(main()), 0)
+
+    def test_failures(self):
+        self.write("print('foo')")
+
+        async def main():
+            process = check50.run_async(f"python3 ./{self.filename}")
+            with self.assertRaises(check50.Mismatch):
+                await process.stdout("bar")
+            with self.assertRaises(check50.Failure):
+                await check50.run_async(f"python3 ./{self.filename}").exit(1)
+
+        asyncio.run(main())
+
+    def test_concurrent(self):
+        self.write("import time\nx = input()\ntime.sleep(1)\nprint(x)\n")
+
+        async def one(i):
+            process = check50.run_async(f"python3 ./{self.filename}")
+            await process.stdin(str(i), prompt=False)
+            await process.stdout(str(i))
+            await process.exit(0)
+
+        async def main():
+            await asyncio.gather(*(one(i) for i in range(4)))
+
+        start = time.monotonic()
+        asyncio.run(main())
+        self.assertLess(time.monotonic() - start, 3)
+
+
+class TestRunMany(Base):
+    def test_all_pass(self):
+        self.write("x = int(input('x: '))\nprint(x * 2)\nexit(x % 3)\n")
+        cases = [(str(i), str(i * 2), i % 3) for i in range(10)]
+        check50.run_many(f"python3 ./{self.filename}", cases, workers=4)
+
+    def test_failures(self):
+        self.write("x = int(input('x: '))\nprint(x * 2 if x != 3 else 0)\n")
+        cases = [(str(i), str(i * 2)) for i in range(1, 10)]
+        with self.assertRaises(check50.Failure) as cm:
+            check50.run_many(f"python3 ./{self.filename}", cases, workers=4)
+        self.assertEqual(cm.exception.payload["rationale"], "1 of 9 cases failed")
+        self.assertEqual(len(cm.exception.payload["cases"]), 1)
+        self.assertEqual(cm.exception.payload["cases"][0]["input"], '"3"')
+
+    def test_many_inputs(self):
+        self.write("x = input('x: ')\ny = input('y: ')\nprint(x + y)\n")
+        check50.run_many(f"python3 ./{self.filename}", [(["a", "b"], "ab\n", 0), (["c", "d"], "cd\n", 0)])
+
+        with self.assertRaises(check50.Failure):
+            check50.run_many(f"python3 ./{self.filename}", [(["a", "b"], "ba\n")], workers=1)
+
+
+class TestLimits(Base):
+    def tearDown(self):
+        check50.internal.limits = {}
+        super().tearDown()
+
+    def test_cpu(self):
+        self.write("while True:\n    pass\n")
+        self.process = check50.run(f"python3 ./{self.filename}", limits={"cpu": 1})
+        with self.assertRaises(check50.Failure) as cm:
+            self.process.exit(timeout=5)
+        self.assertIn("CPU time", cm.exception.payload["rationale"])
+
+    def test_exit_code_above_128(self):
+        # A program that exits with 137 by itself was not killed (by SIGKILL), whether or not bash ran it
+        self.write("import sys\nsys.exit(137)\n")
+        check50.run(f"python3 ./{self.filename}", limits={"cpu": 10}).exit(137)
+
+        # Whereas bash reports a command killed by SIGKILL as having exited with 137
+        with self.assertRaises(check50.Failure) as cm:
+            check50.run("bash -c 'kill -9 $$'; exit $?", limits={"cpu": 10}).exit(137)
+        self.assertIn("CPU time", cm.exception.payload["rationale"])
+
+    def test_file_size(self):
+        for tty in (True, False):
+            self.process = check50.run("head -c 100000 /dev/zero > out", tty=tty, limits={"file_size": "10K"})
+            with self.assertRaises(check50.Failure) as cm:
+                self.process.exit(0)
+            self.assertIn("10240 bytes", cm.exception.payload["rationale"])
+
+    def test_memory(self):
+        self.write("x = bytearray(256 * 1024 * 1024)\n")
+        self.process = check50.run(f"python3 ./{self.filename}", limits={"memory": "128M"})
+        self.process.exit(1)
+
+        self.runpy()
+        self.process.exit(0)
+
+    def test_default_limits(self):
+        check50.internal.limits = {"cpu": 1, "memory": 2 ** 30}
+        self.process = check50.run("true", limits={"memory": "1M"})
+        self.assertEqual(self.process.limits, {"cpu": 1, "memory": 1024 ** 2})
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            check50.run("true", limits={"time": 1})
+        with self.assertRaises(ValueError):
+            check50.run("true", limits={"cpu": "1 minute"})
+
+
 class TestProcessExit(Base):
     def test_exit(self):
         self.write("sys.exit(1)")
@@ -276,6 +483,24 @@ class TestProcessExit(Base):
         exit_code = self.process.exit()
         self.assertEqual(exit_code, 1)
 
+    def test_closed_output(self):
+        # The program closes its terminal but keeps running
+        process = check50.run("exec </dev/null >/dev/null 2>&1; sleep 30")
+        start = time.monotonic()
+        with self.assertRaises(check50.Failure):
+            process.exit(timeout=.5)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertFalse(process.process.isalive())
+
+    def test_without_waitid(self):
+        # As on platforms without os.waitid, such as macOS before Python 3.13
+        waitid = os.waitid
+        del os.waitid
+        try:
+            check50.run("exit 3").exit(3)
+        finally:
+            os.waitid = waitid
+
 class TestProcessKill(Base):
     def test_kill(self):
         self.runpy()
@@ -296,5 +521,138 @@ class TestProcessReject(Base):
         with self.assertRaises(check50.Failure):
             self.process.reject()
 
+@unittest.skipIf(sys.platform == "darwin", "commands always run via bash on macOS")
+class TestSimpleCommand(Base):
+    def test_simple(self):
+        self.assertEqual(check50._api._simple_command("python3 foo.py bar"), [shutil.which("python3"), "foo.py", "bar"])
+
+        os.chmod(self.filename, 0o755)
+        self.assertEqual(check50._api._simple_command(f"./{self.filename} --baz=1"), [f"./{self.filename}", "--baz=1"])
+
+    def test_not_simple(self):
+        for command in ("echo foo", "exit 1", "ls *.py", "python3 foo.py > bar", "python3 'foo.py'", "FOO=bar python3",
+                        "cd ~", "python3 foo.py; ls", "python3 $FOO", f"./{self.filename}", "./bar", "no_such_program"):
+            with self.subTest(command=command):
+                self.assertIsNone(check50._api._simple_command(command))
+
+    def test_script_without_shebang(self):
+        self.write("echo foo")
+        os.chmod(self.filename, 0o755)
+        self.process = check50.run(f"./{self.filename}")
+        self.assertEqual(self.process.stdout(), "foo\n")
+
+    def test_exit_and_signal(self):
+        self.write("import os, signal, sys\nif sys.argv[1] == 'kill':\n    os.kill(os.getpid(), signal.SIGSEGV)\nsys.exit(3)")
+        self.process = check50.run(f"python3 {self.filename} exit")
+        self.process.exit(3)
+
+        self.process = check50.run(f"python3 {self.filename} kill")
+        with self.assertRaises(check50.Failure):
+            self.process.exit()
+
+
+@unittest.skipUnless(sys.platform == "linux", "requires /proc")
+class TestFailFast(Base):
+    def setUp(self):
+        super().setUp()
+        self.write("print('foo', end='', flush=True)\ninput()")
+        self.runpy()
+
+    def assertFast(self, func, exception=None):
+        start = time.perf_counter()
+        if exception:
+            with self.assertRaises(exception):
+                func()
+        else:
+            func()
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_stdout(self):
+        self.assertFast(lambda: self.process.stdout("bar", timeout=3), check50.Missing)
+
+    def test_stdout_before_waiting(self):
+        self.assertFast(lambda: self.process.stdout("foo", timeout=3))
+
+    def test_exit(self):
+        self.assertFast(lambda: self.process.exit(timeout=5), check50.Failure)
+
+    def test_reject(self):
+        self.assertFast(lambda: self.process.reject(timeout=3))
+
+    def test_no_prompt(self):
+        self.process.kill()
+        self.write("input()")
+        self.runpy()
+        self.assertFast(lambda: self.process.stdin("bar", timeout=3), check50.Failure)
+
+
+class TestOutputLimits(Base):
+    def setUp(self):
+        super().setUp()
+        self.write("print('a' * 5000 + 'b')\nprint('c' * 3000)")
+        self.limits = check50.run.max_output_in_memory, check50.run.max_output
+        check50.run.max_output_in_memory = 1000
+
+    def tearDown(self):
+        super().tearDown()
+        check50.run.max_output_in_memory, check50.run.max_output = self.limits
+
+    def test_spooled_output(self):
+        self.runpy()
+        self.assertEqual(self.process.stdout(), "a" * 5000 + "b\n" + "c" * 3000 + "\n")
+
+    def test_match_after_spooling(self):
+        self.runpy()
+        self.process.stdout("b\n")
+        self.assertEqual(self.process.stdout(), "c" * 3000 + "\n")
+
+    def test_too_much_output(self):
+        check50.run.max_output = 6000
+        self.runpy()
+        with self.assertRaises(check50.Failure):
+            self.process.stdout("d")
+
+
+class TestRunWithoutTty(Base):
+    def runpy(self):
+        self.process = check50.run(f"python3 ./{self.filename}", tty=False)
+
+    def test_stdin_stdout(self):
+        self.write("print(input() * 2)")
+        self.runpy()
+        self.process.stdin("foo", prompt=False).stdout("foofoo\n").stdout(check50.EOF).exit(0)
+
+    def test_eof(self):
+        self.write("import sys\nprint(len(sys.stdin.read()))")
+        self.runpy()
+        self.process.stdin("foo", prompt=False).stdin(check50.EOF, prompt=False).stdout("4").exit(0)
+
+    def test_exit(self):
+        self.write("import sys\nsys.exit(3)")
+        self.runpy()
+        self.assertEqual(self.process.exit(), 3)
+
+    def test_no_tty(self):
+        self.write("import sys\nprint(sys.stdin.isatty(), sys.stdout.isatty())")
+        self.runpy()
+        self.assertEqual(self.process.stdout(), "False False\n")
+
+    def test_kill(self):
+        self.write("input()")
+        self.runpy()
+        self.assertTrue(self.process.process.isalive())
+        self.process.kill()
+        self.assertFalse(self.process.process.isalive())
+
+    def test_default(self):
+        self.write("import sys\nprint(sys.stdout.isatty())")
+        check50.run.tty = False
+        try:
+            self.process = check50.run(f"python3 ./{self.filename}")
+        finally:
+            check50.run.tty = True
+        self.assertEqual(self.process.stdout(), "False\n")
+
+
 if __name__ == '__main__':
     unittest.main()
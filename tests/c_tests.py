@@ -1,25 +1,33 @@
+import asyncio
 import pexpect
+import threading
 import unittest
+import unittest.mock
 import sys
 import shutil
 import os
 import functools
+import json
 import tempfile
 import pathlib
 import check50
 import check50.c
+import check50._api
+import check50._cache
 import check50.internal
+import lib50
 
 CLANG_INSTALLED = bool(shutil.which("clang"))
 VALGRIND_INSTALLED = bool(shutil.which("valgrind"))
 CHECKS_DIRECTORY = pathlib.Path(__file__).absolute().parent / "checks"
 
-class Base(unittest.TestCase):
+# Compiler for tests that work with any C compiler
+CC = next((cc for cc in ("clang", "gcc") if shutil.which(cc)), None)
+
+class CompilerBase(unittest.TestCase):
     def setUp(self):
-        if not CLANG_INSTALLED:
-            raise unittest.SkipTest("clang not installed")
-        if not VALGRIND_INSTALLED:
-            raise unittest.SkipTest("valgrind not installed")
+        if not CC:
+            raise unittest.SkipTest("no C compiler installed")
 
         self.working_directory = tempfile.TemporaryDirectory()
         os.chdir(self.working_directory.name)
@@ -27,6 +35,14 @@ class Base(unittest.TestCase):
     def tearDown(self):
         self.working_directory.cleanup()
 
+class Base(CompilerBase):
+    def setUp(self):
+        if not CLANG_INSTALLED:
+            raise unittest.SkipTest("clang not installed")
+        if not VALGRIND_INSTALLED:
+            raise unittest.SkipTest("valgrind not installed")
+        super().setUp()
+
 class TestCompile(Base):
     def test_compile_incorrect(self):
         open("blank.c", "w").close()
@@ -47,6 +63,219 @@ class TestCompile(Base):
         self.assertTrue(os.path.isfile("hello"))
         check50.run("./hello").stdout("hello, world!", regex=False)
 
+class TestCompileCache(CompilerBase):
+    def setUp(self):
+        super().setUp()
+        self._local_path = lib50.get_local_path()
+        lib50.set_local_path("local")
+
+    def tearDown(self):
+        lib50.set_local_path(self._local_path)
+        super().tearDown()
+
+    def test_cache(self):
+        with open("hello.c", "w") as f:
+            f.write('#include <stdio.h>\n#include "hello.h"\nint main() { printf(GREETING); }')
+        with open("hello.h", "w") as f:
+            f.write('#define GREETING "hello\\n"\n')
+
+        check50.c.compile("hello.c", cc=CC)
+        os.remove("hello")
+
+        # Restored from the cache, without running the compiler
+        with unittest.mock.patch("check50.c.run", side_effect=AssertionError):
+            check50.c.compile("hello.c", cc=CC)
+        check50.run("./hello").stdout("hello\n")
+
+        with open("hello.h", "w") as f:
+            f.write('#define GREETING "bye\\n"\n')
+        check50.c.compile("hello.c", cc=CC)
+        check50.run("./hello").stdout("bye\n")
+
+    def test_cache_failed_compile(self):
+        with open("foo.c", "w") as f:
+            f.write("int main(void)\n{\n    return y;\n}\n")
+
+        check50._api._log.clear()
+        with self.assertRaises(check50.Failure):
+            check50.c.compile("foo.c", cc=CC)
+        log = check50._api._log.copy()
+        self.assertTrue(any("return y;" in line for line in log))
+
+        # The compiler's rendering of its diagnostics is restored from the cache, along with them
+        check50._api._log.clear()
+        check50._api._data.clear()
+        with unittest.mock.patch("check50.c.run", side_effect=AssertionError):
+            with self.assertRaises(check50.Failure):
+                check50.c.compile("foo.c", cc=CC)
+        self.assertEqual(check50._api._log, log)
+        self.assertEqual(len(check50._api._data["diagnostics"]), 1)
+
+    def test_include_dirs(self):
+        os.mkdir("include")
+        with open("hello.c", "w") as f:
+            f.write('#include <stdio.h>\n#include <hello.h>\nint main() { printf(GREETING); }')
+        with open("include/hello.h", "w") as f:
+            f.write('#define GREETING "hello\\n"\n')
+
+        with unittest.mock.patch.dict(os.environ, {"CPATH": "include"}):
+            check50.c.compile("hello.c", cc=CC)
+            check50.run("./hello").stdout("hello\n")
+
+            # A header found on the include path is part of the key
+            with open("include/hello.h", "w") as f:
+                f.write('#define GREETING "bye\\n"\n')
+            check50.c.compile("hello.c", cc=CC)
+            check50.run("./hello").stdout("bye\n")
+
+    def test_included(self):
+        os.mkdir("include")
+        os.mkdir("quote")
+        os.mkdir("path")
+        with open("hello.c", "w") as f:
+            f.write('#include <stdio.h>\n#include "a.h"\n#include <b.h>\n#include <c.h>\n')
+        for header in ("quote/a.h", "include/b.h", "path/c.h"):
+            open(header, "w").close()
+
+        with unittest.mock.patch.dict(os.environ, {"CPATH": "path"}):
+            included = check50.c._included(["hello.c"], f"{CC} hello.c -iquote quote -Iinclude")
+        self.assertEqual(included, ["hello.c", "quote/a.h", "include/b.h", "path/c.h"])
+
+        # Without the directories, only the source
+        self.assertEqual(check50.c._included(["hello.c"], f"{CC} hello.c"), ["hello.c"])
+
+    def test_separate_compilation(self):
+        with open("hello.c", "w") as f:
+            f.write('#include <stdio.h>\n#include "greeting.h"\nint main() { printf("%s\\n", greeting()); }')
+        with open("greeting.h", "w") as f:
+            f.write('const char *greeting(void);\n')
+        with open("greeting.c", "w") as f:
+            f.write('#include "greeting.h"\nconst char *greeting(void) { return "hello"; }')
+
+        check50._api._log.clear()
+        check50.c.compile("hello.c", "greeting.c", cc=CC)
+        self.assertEqual(check50._api._log, [f"running {CC} hello.c greeting.c -o hello -std=c11 -ggdb -lm..."])
+        check50.run("./hello").stdout("hello\n")
+
+        with open("greeting.c", "w") as f:
+            f.write('#include "greeting.h"\nconst char *greeting(void) { return "bye"; }')
+
+        # Only greeting.c is compiled again
+        with unittest.mock.patch("check50.c.run", wraps=check50.c.run) as run:
+            check50.c.compile("hello.c", "greeting.c", cc=CC)
+        compiled = [call[0][0] for call in run.call_args_list if " -c " in call[0][0]]
+        self.assertEqual(len(compiled), 1)
+        self.assertIn("greeting.c", compiled[0])
+        check50.run("./hello").stdout("bye\n")
+
+        with open("greeting.c", "w") as f:
+            f.write('const char *greeting(void) { return bye; }')
+        with self.assertRaises(check50.Failure):
+            check50.c.compile("hello.c", "greeting.c", cc=CC)
+        self.assertTrue(any("greeting.c:1" in line for line in check50._api._log))
+
+
+    def write_sources(self, n):
+        with open("main.c", "w") as f:
+            f.write("".join(f"int f{i}(void);\n" for i in range(n)))
+            f.write("int main(void) { return " + " + ".join(f"f{i}()" for i in range(n)) + "; }")
+        for i in range(n):
+            with open(f"f{i}.c", "w") as f:
+                f.write(f"int f{i}(void) {{ return {i}; }}")
+        return ["main.c"] + [f"f{i}.c" for i in range(n)]
+
+    def test_separate_compilation_in_event_loop(self):
+        sources = self.write_sources(3)
+
+        async def main():
+            check50.c.compile(*sources, cc=CC, cache=False)
+        asyncio.run(main())
+        self.assertEqual(check50.run("./main").exit(), 3)
+
+    def test_compile_slots(self):
+        sources = self.write_sources(4)
+
+        # Without slots to spare, one compiler runs at a time
+        running = []
+        def run(command):
+            running[:] = [process for process in running if process.process.isalive()]
+            self.assertEqual(running, [])
+            process = check50._api.run(command)
+            running.append(process)
+            return process
+
+        with unittest.mock.patch("check50.internal.compile_slots", threading.BoundedSemaphore(1)) as slots, \
+                unittest.mock.patch("check50.c.run", side_effect=run):
+            slots.acquire()
+            check50.c.compile(*sources, cc=CC, cache=False)
+        self.assertEqual(check50.run("./main").exit(), 6)
+
+
+class TestCompileCacheEntries(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.TemporaryDirectory()
+        os.chdir(self.working_directory.name)
+
+        self._local_path = lib50.get_local_path()
+        lib50.set_local_path("local")
+
+        with open("foo.c", "w") as f:
+            f.write("foo")
+        with open("foo", "w") as f:
+            f.write("executable")
+        os.chmod("foo", 0o755)
+
+        self.cache = check50._cache.CompileCache()
+
+    def tearDown(self):
+        lib50.set_local_path(self._local_path)
+        self.working_directory.cleanup()
+
+    def test_keys(self):
+        key = self.cache.key(["cc", "cc foo.c"], ["foo.c"])
+        self.assertEqual(key, self.cache.key(["cc", "cc foo.c"], ["foo.c"]))
+        self.assertNotEqual(key, self.cache.key(["cc", "cc foo.c -O2"], ["foo.c"]))
+
+        with open("foo.c", "w") as f:
+            f.write("bar")
+        self.assertNotEqual(key, self.cache.key(["cc", "cc foo.c"], ["foo.c"]))
+
+    def test_store_and_load(self):
+        key = self.cache.key(["cc"], ["foo.c"])
+        self.assertIsNone(self.cache.load(key, "restored"))
+
+        self.cache.store(key, "warning: foo", 0, "foo")
+        self.assertEqual(self.cache.load(key, "restored"), ("warning: foo", 0, None))
+        with open("restored") as f:
+            self.assertEqual(f.read(), "executable")
+        self.assertEqual(os.stat("restored").st_mode, os.stat("foo").st_mode)
+
+    def test_failed_compilation(self):
+        key = self.cache.key(["cc"], ["foo.c"])
+        self.cache.store(key, "[{\"kind\": \"error\"}]", 1, rendering="foo.c:1:1: error: foo")
+        self.assertEqual(self.cache.load(key, "restored"), ("[{\"kind\": \"error\"}]", 1, "foo.c:1:1: error: foo"))
+        self.assertFalse(os.path.exists("restored"))
+
+    def test_evict(self):
+        self.cache.max_size = 0
+        key = self.cache.key(["cc"], ["foo.c"])
+        self.cache.store(key, "", 0, "foo")
+        self.assertIsNone(self.cache.load(key, "restored"))
+
+    def test_evict_once_full(self):
+        # Only the first store looks at all entries, the others fit
+        with unittest.mock.patch("check50._cache._evict", wraps=check50._cache._evict) as evict:
+            for i in range(3):
+                self.cache.store(self.cache.key([str(i)], ["foo.c"]), "", 0, "foo")
+        self.assertEqual(evict.call_count, 1)
+
+        self.cache.max_size = 0
+        with unittest.mock.patch("check50._cache._evict", wraps=check50._cache._evict) as evict:
+            self.cache.store(self.cache.key(["3"], ["foo.c"]), "", 0, "foo")
+        self.assertEqual(evict.call_count, 1)
+        self.assertEqual(list((lib50.get_local_path() / "compile").iterdir()), [])
+
+
 class TestValgrind(Base):
     def setUp(self):
         super().setUp()
@@ -81,6 +310,267 @@ class TestValgrind(Base):
         check50.internal.check_running = False
 
 
+class TestSanitize(CompilerBase):
+    def setUp(self):
+        super().setUp()
+        check50.internal.check_running = True
+        check50.internal.run_dir = pathlib.Path.cwd()
+
+    def tearDown(self):
+        check50.internal.run_dir = None
+        check50.internal.check_running = False
+        super().tearDown()
+
+    def test_sanitize(self):
+        with open("leak.c", "w") as f:
+            src =   '#include <stdlib.h>\n'\
+                    'void *p;\n'\
+                    'void leak() {p = malloc(sizeof(int)); p = NULL;}\n'\
+                    'int main() {\n'\
+                    '    leak();\n'\
+                    '}'
+            f.write(src)
+
+        check50.c.compile("leak.c", cc=CC, sanitize=True)
+        with self.assertRaises(check50.Failure):
+            with check50.internal.register:
+                # Runs with the sanitizers compiled into leak, rather than with valgrind
+                check50.c.valgrind("./leak").exit(0)
+        self.assertIn("\tDirect leak of 4 byte(s) in 1 object(s): (file: leak.c, line: 3)", check50._api._log)
+
+    def test_past_errors(self):
+        with open("free.c", "w") as f:
+            src =   '#include <stdio.h>\n'\
+                    '#include <stdlib.h>\n'\
+                    'int main() {\n'\
+                    '    int *p = malloc(sizeof(int));\n'\
+                    '    free(p);\n'\
+                    '    *p = 1;\n'\
+                    '    printf("after\\n");\n'\
+                    '    return 2;\n'\
+                    '}'
+            f.write(src)
+
+        check50.c.compile("free.c", cc=CC, sanitize=True)
+        with self.assertRaises(check50.Failure) as context:
+            with check50.internal.register:
+                check50.c.sanitize("./free").stdout("after\n").exit(2)
+        self.assertEqual(context.exception.payload["rationale"], "sanitizer tests failed; see log for more information.")
+        self.assertIn("\theap-use-after-free (write of size 4): (file: free.c, line: 6)", check50._api._log)
+
+    def test_failed_check(self):
+        with open("free.c", "w") as f:
+            src =   '#include <stdlib.h>\n'\
+                    'int main() {\n'\
+                    '    int *p = malloc(sizeof(int));\n'\
+                    '    free(p);\n'\
+                    '    *p = 1;\n'\
+                    '}'
+            f.write(src)
+
+        check50.c.compile("free.c", cc=CC, sanitize=True)
+        with self.assertRaises(check50.Failure) as context:
+            with check50.internal.register:
+                check50.c.sanitize("./free").stdout("foo")
+
+        # The check fails on its own terms, yet the sanitizers' report is logged all the same
+        self.assertNotEqual(context.exception.payload["rationale"], "sanitizer tests failed; see log for more information.")
+        self.assertIn("\theap-use-after-free (write of size 4): (file: free.c, line: 5)", check50._api._log)
+
+
+class TestSanitizerReports(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.TemporaryDirectory()
+        open(os.path.join(self.working_directory.name, "foo.c"), "w").close()
+
+        self._run_dir = check50.internal.run_dir
+        check50.internal.run_dir = pathlib.Path(self.working_directory.name)
+
+    def tearDown(self):
+        check50.internal.run_dir = self._run_dir
+        self.working_directory.cleanup()
+
+    def test_address(self):
+        report = "\n".join([
+            "=================================================================",
+            "==1120==ERROR: AddressSanitizer: heap-use-after-free on address 0x602000000010 at pc 0x55f6bed982aa",
+            "WRITE of size 4 at 0x602000000010 thread T0",
+            "    #0 0x55f6bed982a9 in main /tmp/run/foo.c:4:5",
+            "    #1 0x7fc878445249  (/lib/x86_64-linux-gnu/libc.so.6+0x27249)",
+            "",
+            "freed by thread T0 here:",
+            "    #0 0x7fc878eb76a8 in __interceptor_free ../../../../src/libsanitizer/asan/asan_malloc_linux.cpp:52",
+            "    #1 0x55f6bed9824a in main /tmp/run/foo.c:3",
+            "",
+            "SUMMARY: AddressSanitizer: heap-use-after-free /tmp/run/foo.c:4 in main",
+        ])
+        self.assertEqual(list(check50.c._sanitizer_errors(report)),
+                         ["\theap-use-after-free (write of size 4): (file: foo.c, line: 4)"])
+
+    def test_leaks(self):
+        report = "\n".join([
+            "==1142==ERROR: LeakSanitizer: detected memory leaks",
+            "",
+            "Direct leak of 4 byte(s) in 1 object(s) allocated from:",
+            "    #0 0x7f126aeb89cf in __interceptor_malloc ../../../../src/libsanitizer/asan/asan_malloc_linux.cpp:69",
+            "    #1 0x55a3a535e186 in leak /tmp/run/foo.c:3",
+            "    #2 0x55a3a535e1a4 in main /tmp/run/foo.c:4",
+            "",
+            "Indirect leak of 8 byte(s) in 1 object(s) allocated from:",
+            "    #0 0x7f126aeb89cf in __interceptor_malloc ../../../../src/libsanitizer/asan/asan_malloc_linux.cpp:69",
+            "    #1 0x7f126a445249  (/lib/x86_64-linux-gnu/libc.so.6+0x27249)",
+            "",
+            "SUMMARY: AddressSanitizer: 12 byte(s) leaked in 2 allocation(s).",
+        ])
+        self.assertEqual(list(check50.c._sanitizer_errors(report)),
+                         ["\tDirect leak of 4 byte(s) in 1 object(s): (file: foo.c, line: 3)",
+                          "\tIndirect leak of 8 byte(s) in 1 object(s)"])
+
+    def test_undefined_behavior(self):
+        report = "\n".join([
+            "foo.c:4:68: runtime error: signed integer overflow: 2147483647 + 1 cannot be represented in type 'int'",
+            "    #0 0x55f6bed98222 in main /tmp/run/foo.c:4",
+            "",
+        ])
+        self.assertEqual(list(check50.c._sanitizer_errors(report)), ["\tsigned integer overflow: 2147483647 + 1 cannot be represented in type 'int': "
+                                  "(file: foo.c, line: 4)"])
+
+
+class TestValgrindReports(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.TemporaryDirectory()
+        self._run_dir = check50.internal.run_dir
+        check50.internal.run_dir = pathlib.Path(self.working_directory.name)
+        check50._api._log.clear()
+
+    def tearDown(self):
+        check50.internal.run_dir = self._run_dir
+        self.working_directory.cleanup()
+
+    def report(self, lines, end=True):
+        xml_file = tempfile.NamedTemporaryFile()
+        xml_file.write(b'<?xml version="1.0"?>\n<valgrindoutput>\n')
+        for line in lines:
+            xml_file.write(f"<error><kind>InvalidRead</kind><what>Invalid read of size 4</what><stack>"
+                           f"<frame><obj>{self.working_directory.name}/foo</obj><file>foo.c</file><line>{line}</line></frame>"
+                           f"</stack></error>\n".encode())
+        if end:
+            xml_file.write(b"</valgrindoutput>\n")
+        xml_file.flush()
+        xml_file.seek(0)
+        return xml_file
+
+    def test_errors(self):
+        with self.assertRaises(check50.Failure):
+            check50.c._check_valgrind(self.report([1, 2, 1]))
+        self.assertEqual(check50._api._log, ["checking for valgrind errors...",
+                                             "\tInvalid read of size 4: (file: foo.c, line: 1)",
+                                             "\tInvalid read of size 4: (file: foo.c, line: 2)"])
+
+    def test_unfinished_report(self):
+        with self.assertRaises(check50.Failure):
+            check50.c._check_valgrind(self.report([1, 2], end=False))
+        self.assertEqual(len(check50._api._log), 3)
+
+        # But valgrind must have started its report
+        with self.assertRaises(check50.c.ET.ParseError):
+            check50.c._check_valgrind(tempfile.NamedTemporaryFile())
+
+    def test_max_errors(self):
+        lines = range(check50.c._MAX_VALGRIND_ERRORS * 2)
+        with self.assertRaises(check50.Failure):
+            check50.c._check_valgrind(self.report(lines))
+        self.assertEqual(len(check50._api._log), check50.c._MAX_VALGRIND_ERRORS + 2)
+
+
+class TestDiagnostics(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.TemporaryDirectory()
+        os.chdir(self.working_directory.name)
+        check50._api._log.clear()
+        check50._api._data.clear()
+
+    def tearDown(self):
+        self.working_directory.cleanup()
+
+    def test_gcc(self):
+        error = {"kind": "error", "message": "'y' undeclared", "children": [{"kind": "note", "message": "each undeclared identifier"}],
+                 "locations": [{"caret": {"file": "foo.c", "line": 3, "column": 26}}]}
+        warning = {"kind": "warning", "message": "unused variable 'x'", "children": [],
+                   "locations": [{"caret": {"file": "foo.c", "line": 1, "column": 22}}]}
+        output = "\n".join([json.dumps([error, warning]), json.dumps([error]), "compilation terminated.", ""])
+
+        records, text = check50.c._diagnostics(output)
+        self.assertEqual(records, [{"file": "foo.c", "line": 1, "column": 22, "level": "warning", "message": "unused variable 'x'"},
+                                   {"file": "foo.c", "line": 3, "column": 26, "level": "error", "message": "'y' undeclared"}])
+        self.assertEqual(text, ["compilation terminated."])
+
+    def test_sarif(self):
+        sarif = {"version": "2.1.0", "runs": [{"results": [
+            {"level": "error", "message": {"text": "use of undeclared identifier 'y'"}, "ruleId": "3239",
+             "locations": [{"physicalLocation": {"artifactLocation": {"index": 0, "uri": pathlib.Path("foo.c").absolute().as_uri()},
+                                                 "region": {"startLine": 3, "startColumn": 26}}}]},
+            {"level": "note", "message": {"text": "declared here"}}
+        ]}]}
+        records, text = check50.c._diagnostics(json.dumps(sarif, indent=2) + "\n1 error generated.\n")
+        self.assertEqual(records, [{"file": "foo.c", "line": 3, "column": 26, "level": "error",
+                                    "message": "use of undeclared identifier 'y'"}])
+        self.assertEqual(text, ["1 error generated."])
+
+    def test_text(self):
+        records, text = check50.c._diagnostics("\x1b[1mfoo.c:1:1: \x1b[0;1;31merror: \x1b[0mexpected ';'\n[not json\n")
+        self.assertIsNone(records)
+        self.assertEqual(text, ["foo.c:1:1: error: expected ';'", "[not json"])
+
+    def test_failed_compile(self):
+        if not CC:
+            raise unittest.SkipTest("no C compiler installed")
+        with open("foo.c", "w") as f:
+            f.write("int main(void)\n{\n    return y;\n}\n")
+
+        with self.assertRaises(check50.Failure):
+            check50.c.compile("foo.c", cc=CC, cache=False)
+
+        # Logged as rendered by the compiler, code and all, while the records are kept as data
+        self.assertTrue(any("foo.c:3:12: error:" in line for line in check50._api._log))
+        self.assertTrue(any("return y;" in line for line in check50._api._log))
+        self.assertTrue(any(line.strip().endswith("^") for line in check50._api._log))
+        self.assertFalse(any("\x1b" in line for line in check50._api._log))
+        self.assertEqual([(record["file"], record["line"], record["level"]) for record in check50._api._data["diagnostics"]],
+                         [("foo.c", 3, "error")])
+
+    def test_link_to_clang(self):
+        # A clang that records its arguments and creates the file it outputs, run as cc (which links to it)
+        with open("clang", "w") as f:
+            f.write('#!/bin/bash\n'
+                    'echo "$*" >> args\n'
+                    'while [[ $# -gt 0 ]]; do if [[ "$1" == -o ]]; then touch "$2"; fi; shift; done\n')
+        os.chmod("clang", 0o755)
+        os.symlink("clang", "cc")
+        open("foo.c", "w").close()
+        open("bar.c", "w").close()
+
+        check50.c.compile("foo.c", "bar.c", cc="./cc", cache=False)
+        with open("args") as f:
+            args = f.read().splitlines()
+        self.assertEqual(len(args), 3)
+        self.assertTrue(all("-Qunused-arguments" in line and "-fdiagnostics-format=sarif" in line for line in args))
+
+    def test_compiler_without_json(self):
+        # A compiler that rejects -fdiagnostics-format, and otherwise fails with a diagnostic as text
+        with open("gcc", "w") as f:
+            f.write('#!/bin/bash\n'
+                    'if [[ "$*" == *-fdiagnostics-format* ]]; then echo "unrecognized option"; exit 1; fi\n'
+                    'echo "foo.c:1:1: error: expected \';\'"; exit 1\n')
+        os.chmod("gcc", 0o755)
+        open("foo.c", "w").close()
+
+        with self.assertRaises(check50.Failure):
+            check50.c.compile("foo.c", cc="./gcc", cache=False)
+        self.assertEqual(check50._api._log, ["running ./gcc foo.c -o foo -std=c11 -ggdb -lm...", "foo.c:1:1: error: expected ';'"])
+        self.assertNotIn("diagnostics", check50._api._data)
+
+
 if __name__ == "__main__":
     suite = unittest.TestLoader().loadTestsFromModule(module=sys.modules[__name__])
     unittest.TextTestRunner(verbosity=2).run(suite)
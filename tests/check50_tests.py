@@ -1,11 +1,14 @@
 import unittest
 import json
+import multiprocessing
 import pexpect
 import pathlib
 import shutil
 import subprocess
 import os
+import tarfile
 import tempfile
+import time
 
 CHECKS_DIRECTORY = pathlib.Path(__file__).absolute().parent / "checks"
 
@@ -349,6 +352,31 @@ class TestOutputModes(Base):
             json_out = json.load(f)
             self.assertEqual(json_out["results"][0]["name"], "exists")
 
+    def test_ndjson_output(self):
+        pexpect.run(f"check50 --dev -o ndjson --output-file foo.json {CHECKS_DIRECTORY}/exit_py")
+        with open("foo.json", "r") as f:
+            lines = [json.loads(line) for line in f]
+
+        self.assertEqual([line["name"] for line in lines[:-1]], ["exists", "exits"])
+        self.assertEqual(lines[1]["passed"], None)
+        self.assertEqual(lines[-1]["summary"], {"passed": 0, "failed": 1, "skipped": 1})
+
+    def test_ndjson_interrupted(self):
+        process = pexpect.spawn(f"check50 --dev --no-cache -o ndjson --output-file foo.json {CHECKS_DIRECTORY}/interrupt")
+        for _ in range(100):
+            if os.path.exists("foo.json") and os.path.getsize("foo.json"):
+                break
+            time.sleep(0.1)
+        process.sendintr()
+        process.expect(pexpect.EOF, timeout=20)
+
+        with open("foo.json", "r") as f:
+            lines = [json.loads(line) for line in f]
+
+        # The error is appended to the results streamed so far
+        self.assertEqual(lines[0]["name"], "exists")
+        self.assertEqual(lines[-1]["error"]["type"], "KeyboardInterrupt")
+
     def test_ansi_output(self):
         process = pexpect.spawn(f"check50 --dev -o ansi -- {CHECKS_DIRECTORY}/output")
         process.expect_exact(":(")
@@ -377,7 +405,10 @@ class TestHiddenCheck(Base):
         pexpect.run(f"check50 --dev -o json --output-file foo.json {CHECKS_DIRECTORY}/hidden")
         expected = [{'name': 'check', 'description': "check", 'passed': False, 'log': [], 'cause': {"rationale": "foo", "help": None}, 'data': {}, 'dependency': None}]
         with open("foo.json", "r") as f:
-            self.assertEqual(json.load(f)["results"], expected)
+            results = json.load(f)["results"]
+        self.assertIsInstance(results[0].pop("time"), float)
+        self.assertIsInstance(results[0].pop("resources"), dict)
+        self.assertEqual(results, expected)
 
 
 class TestPayloadCheck(Base):
@@ -492,5 +523,269 @@ class TestExitCode(Base):
         self.assertEqual(process.returncode, 0)
 
 
+class TestBatch(Base):
+    def test_batch(self):
+        os.mkdir("foo")
+        os.mkdir("bar")
+        open("foo/foo.py", "w").close()
+        shutil.make_archive("baz", "zip", "foo")
+
+        pexpect.run(f"check50 --dev -o json --output-file out.json --batch foo bar baz.zip missing -- {CHECKS_DIRECTORY}/exists")
+        with open("out.json", "r") as f:
+            documents = [json.loads(line) for line in f]
+
+        self.assertEqual([document["submission"] for document in documents], ["foo", "bar", "baz.zip", "missing"])
+        self.assertTrue(documents[0]["results"][0]["passed"])
+        self.assertFalse(documents[1]["results"][0]["passed"])
+        self.assertTrue(documents[2]["results"][0]["passed"])
+        self.assertEqual(documents[3]["error"]["type"], "Error")
+
+    def test_interrupted(self):
+        for submission in ("foo", "bar"):
+            os.mkdir(submission)
+            with open(f"{submission}/{submission}.py", "w") as f:
+                f.write(submission)
+
+        process = pexpect.spawn(f"check50 --dev --no-cache -o json --output-file out.json --batch foo bar -- {CHECKS_DIRECTORY}/interrupt")
+        for _ in range(200):
+            if os.path.exists("out.json") and os.path.getsize("out.json"):
+                break
+            time.sleep(0.1)
+        process.sendintr()
+        process.expect(pexpect.EOF, timeout=20)
+
+        with open("out.json", "r") as f:
+            documents = [json.loads(line) for line in f]
+
+        # The error is appended to the documents of the submissions checked so far
+        self.assertEqual(documents[0]["submission"], "foo")
+        self.assertEqual(documents[-1]["error"]["type"], "KeyboardInterrupt")
+
+    def test_unsafe_archive(self):
+        os.mkdir("foo")
+        open("foo/foo.py", "w").close()
+        with tarfile.open("foo.tar", "w") as tar:
+            tar.add("foo/foo.py", arcname="foo.py")
+            tar.add("foo/foo.py", arcname="../../escaped.py")
+
+        pexpect.run(f"check50 --dev -o json --output-file out.json --batch foo.tar -- {CHECKS_DIRECTORY}/exists")
+        with open("out.json", "r") as f:
+            documents = [json.loads(line) for line in f]
+
+        self.assertEqual(documents[0]["error"]["type"], "Error")
+        self.assertFalse(os.path.exists(os.path.join(tempfile.gettempdir(), "escaped.py")))
+
+    def test_crashed_worker(self):
+        os.mkdir("foo")
+        os.mkdir("bar")
+        open("foo/crash.py", "w").close()
+
+        pexpect.run(f"check50 --dev --no-cache -o json --output-file out.json --batch foo bar -- {CHECKS_DIRECTORY}/crash")
+        with open("out.json", "r") as f:
+            documents = [json.loads(line) for line in f]
+
+        # The worker that crashed while checking foo is replaced for bar
+        self.assertEqual(documents[0]["error"]["type"], "Error")
+        self.assertTrue(documents[1]["results"][0]["passed"])
+
+
+class TestCache(Base):
+    def setUp(self):
+        super().setUp()
+        self.local_path = tempfile.TemporaryDirectory()
+        self.env = {**os.environ, "CHECK50_PATH": self.local_path.name}
+
+    def tearDown(self):
+        super().tearDown()
+        self.local_path.cleanup()
+
+    def run_checks(self, *args):
+        subprocess.run(["check50", "--dev", "-o", "json", "--output-file", "../out.json", *args, f"{CHECKS_DIRECTORY}/cache"],
+                       env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open("../out.json") as f:
+            return {result["name"]: result["data"].get("time") for result in json.load(f)["results"]}
+
+    def test_cache(self):
+        os.mkdir("submission")
+        os.chdir("submission")
+        open("foo.py", "w").close()
+
+        first = self.run_checks()
+        second = self.run_checks()
+        self.assertEqual(first["cached"], second["cached"])
+        self.assertEqual(first["cached_dependent"], second["cached_dependent"])
+        self.assertNotEqual(first["uncached"], second["uncached"])
+
+        self.assertNotEqual(self.run_checks("--no-cache")["cached"], first["cached"])
+
+        with open("foo.py", "w") as f:
+            f.write("foo")
+        self.assertNotEqual(self.run_checks()["cached"], first["cached"])
+
+    def test_imported_checks(self):
+        os.mkdir("less")
+        with open("less/.cs50.yaml", "w") as f:
+            f.write("check50: true\n")
+        with open("less/__init__.py", "w") as f:
+            f.write("import check50\n\n@check50.check()\ndef less():\n    \"\"\"less\"\"\"\n")
+        os.mkdir("more")
+        with open("more/.cs50.yaml", "w") as f:
+            f.write("check50: true\n")
+        with open("more/__init__.py", "w") as f:
+            f.write('import check50\n\nless = check50.import_checks("../less")\nfrom less import *\n')
+        os.mkdir("submission")
+        os.chdir("submission")
+
+        def passed():
+            subprocess.run(["check50", "--dev", "-o", "json", "--output-file", "../out.json", "--", "../more"],
+                           env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with open("../out.json") as f:
+                return json.load(f)["results"][0]["passed"]
+
+        self.assertTrue(passed())
+        with open("../less/__init__.py", "a") as f:
+            f.write("    raise check50.Failure('less')\n")
+        self.assertFalse(passed())
+
+
+class TestResources(Base):
+    def test_resources(self):
+        pexpect.run(f"check50 --dev --no-cache -o json --output-file foo.json {CHECKS_DIRECTORY}/resources")
+        with open("foo.json", "r") as f:
+            output = json.load(f)
+        results = {result["name"]: result for result in output["results"]}
+
+        children = results["allocates"]["resources"]["children"]
+        self.assertGreater(children["max_rss"], 64 * 1024 * 1024)
+        self.assertGreater(children["cpu_user"] + children["cpu_system"], 0)
+
+        self.assertEqual(results["idles"]["resources"]["children"]["max_rss"], 0)
+        self.assertGreater(results["idles"]["resources"]["max_rss"], 0)
+
+        self.assertEqual(output["resources"]["children"]["max_rss"], children["max_rss"])
+
+class TestRecordReplay(Base):
+    def setUp(self):
+        super().setUp()
+        self.checks = pathlib.Path("checks")
+        shutil.copytree(CHECKS_DIRECTORY / "replay", self.checks)
+
+    def check(self, *args):
+        pexpect.run(f"check50 --dev -o json --output-file foo.json {' '.join(args)} {self.checks}")
+        with open("foo.json") as f:
+            return {result["name"]: result for result in json.load(f)["results"]}
+
+    def test_record_replay(self):
+        with open("foo.py", "w") as f:
+            f.write("word = input('word: ')\nprint(word * 2)\n")
+        results = self.check(f"--record {self.checks / 'transcripts.json'}")
+        self.assertTrue(results["doubles"]["passed"])
+
+        with open(self.checks / "transcripts.json") as f:
+            transcripts = json.load(f)["doubles"]
+        self.assertEqual([transcript["stdin"] for transcript in transcripts], [["a"], ["bc"], ["def"]])
+        self.assertEqual(transcripts[0]["stdout"], ["word: ", "aa\r\n"])
+        self.assertEqual(transcripts[0]["exit"], 0)
+
+        # Replayed, the same solution passes
+        results = self.check("--no-cache")
+        self.assertTrue(results["doubles"]["passed"])
+        self.assertIn("replaying 3 runs of the reference solution...", results["doubles"]["log"])
+
+        # One that doesn't output the same as the reference solution, but passes the check itself, passes
+        with open("foo.py", "w") as f:
+            f.write("word = input('Word: ')\nprint(word * 2)\n")
+        results = self.check("--no-cache")
+        self.assertTrue(results["doubles"]["passed"])
+        self.assertNotIn("replaying 3 runs of the reference solution...", results["doubles"]["log"])
+
+        # One that fails the check itself fails as ever
+        with open("foo.py", "w") as f:
+            f.write("word = input('word: ')\nprint(word)\n")
+        results = self.check("--no-cache")
+        self.assertFalse(results["doubles"]["passed"])
+        self.assertEqual(results["doubles"]["cause"]["expected"], "aa")
+
+    def test_replay_timeout(self):
+        with open("foo.py", "w") as f:
+            f.write("word = input('word: ')\nprint(word * 2)\n")
+        self.check(f"--record {self.checks / 'transcripts.json'}")
+
+        # One run that doesn't exit in time leaves the check itself to run the others, and fail
+        with open("foo.py", "w") as f:
+            f.write("import time\nword = input('word: ')\nprint(word * 2)\nif word == 'bc': time.sleep(60)\n")
+        start = time.monotonic()
+        results = self.check("--no-cache")
+        self.assertLess(time.monotonic() - start, 30)
+        self.assertFalse(results["doubles"]["passed"])
+        self.assertEqual(results["doubles"]["cause"]["rationale"], "timed out while waiting for program to exit")
+
+    def test_no_transcripts(self):
+        with open("foo.py", "w") as f:
+            f.write("word = input('Word: ')\nprint(word * 2)\n")
+        results = self.check("--no-cache")
+        self.assertTrue(results["doubles"]["passed"])
+
+
+class TestTimeout(Base):
+    def is_running(self, pid):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+        except FileNotFoundError:
+            return False
+
+    def test_timeout_kills_processes(self):
+        pids = os.path.abspath("pids")
+        start = time.time()
+        subprocess.run(["check50", "--dev", "--no-cache", "-o", "json", "--output-file", "foo.json", f"{CHECKS_DIRECTORY}/timeout"],
+                       env={**os.environ, "TIMEOUT_PIDS": pids, "CHECK50_WORKERS": "1"},
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.assertLess(time.time() - start, 10)
+
+        with open("foo.json") as f:
+            results = {result["name"]: result for result in json.load(f)["results"]}
+        self.assertFalse(results["times_out"]["passed"])
+        self.assertIn("0.5 seconds", results["times_out"]["cause"]["rationale"])
+        self.assertTrue(results["leaves_process_behind"]["passed"])
+
+        with open(pids) as f:
+            pids = [int(pid) for pid in f.read().split()]
+        self.assertEqual(len(pids), 2)
+        time.sleep(.5)
+        for pid in pids:
+            self.assertFalse(self.is_running(pid))
+
+
+class TestModuleState(Base):
+    def test_state_is_reset_between_checks(self):
+        process = subprocess.run(
+            ["check50", "--dev", "-o", "json", "--output-file", "foo.json", f"{CHECKS_DIRECTORY}/module_state"],
+            env={**os.environ, "CHECK50_WORKERS": "1"},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        with open("foo.json", "r") as f:
+            results = json.load(f)["results"]
+
+        self.assertEqual([result["passed"] for result in results], [True, True])
+        self.assertEqual(process.returncode, 0)
+
+    def test_start_methods(self):
+        for start_method in multiprocessing.get_all_start_methods():
+            with self.subTest(start_method=start_method):
+                process = subprocess.run(
+                    ["check50", "--dev", "--no-cache", "-o", "json", "--output-file", "foo.json", f"{CHECKS_DIRECTORY}/module_state"],
+                    env={**os.environ, "CHECK50_WORKERS": "1", "CHECK50_START_METHOD": start_method},
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
+                with open("foo.json", "r") as f:
+                    results = json.load(f)["results"]
+
+                self.assertEqual([result["passed"] for result in results], [True, True])
+                self.assertEqual(process.returncode, 0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,17 @@
+import check50
+import time
+
+@check50.check()
+def cached():
+    """cached"""
+    check50.data(time=time.time())
+
+@check50.check(cached)
+def cached_dependent():
+    """cached dependent"""
+    check50.data(time=time.time())
+
+@check50.check(cache=False)
+def uncached():
+    """uncached"""
+    check50.data(time=time.time())
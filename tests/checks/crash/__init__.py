@@ -0,0 +1,10 @@
+import os
+
+import check50
+
+@check50.check()
+def crashes():
+    """crashes if crash.py exists"""
+    if os.path.exists("crash.py"):
+        # Takes the worker running this check down with it
+        os._exit(1)
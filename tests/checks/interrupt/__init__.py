@@ -0,0 +1,13 @@
+import time
+
+import check50
+
+@check50.check()
+def exists():
+    """exists"""
+    pass
+
+@check50.check(exists)
+def hangs():
+    """hangs"""
+    time.sleep(5)
@@ -0,0 +1,17 @@
+import check50
+
+calls = []
+
+@check50.check()
+def first():
+    """first check sees fresh module state"""
+    calls.append("first")
+    if calls != ["first"]:
+        raise check50.Failure(f"module state leaked: {calls}")
+
+@check50.check()
+def second():
+    """second check sees fresh module state"""
+    calls.append("second")
+    if calls != ["second"]:
+        raise check50.Failure(f"module state leaked: {calls}")
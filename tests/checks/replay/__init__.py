@@ -0,0 +1,12 @@
+import check50
+
+@check50.check()
+def exists():
+    """foo.py exists"""
+    check50.exists("foo.py")
+
+@check50.check(exists, timeout=15, replay=True)
+def doubles():
+    """foo.py doubles its input"""
+    for word in ("a", "bc", "def"):
+        check50.run("python3 foo.py").stdin(word).stdout(word * 2).exit(0)
@@ -0,0 +1,11 @@
+import check50
+
+@check50.check()
+def allocates():
+    """allocates"""
+    check50.run("python3 -c 'x = bytearray(64 * 1024 * 1024); sum(range(10 ** 6))'").exit(0)
+
+@check50.check()
+def idles():
+    """idles"""
+    pass
@@ -0,0 +1,13 @@
+import check50
+
+# Processes that ignore the SIGHUP they get once their terminal goes away
+
+@check50.check(timeout=0.5)
+def times_out():
+    """times out"""
+    check50.run("trap '' HUP; sleep 30 & echo $! >> $TIMEOUT_PIDS; sleep 30").stdout("never", timeout=10)
+
+@check50.check()
+def leaves_process_behind():
+    """leaves process behind"""
+    check50.run("trap '' HUP; sleep 30 & echo $! >> $TIMEOUT_PIDS").exit(0)
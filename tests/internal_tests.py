@@ -19,6 +19,29 @@ class TestRegisterAfterCheck(unittest.TestCase):
         self.assertEqual(l, ["foo"])
         check50.internal.check_running = False
 
+    def test_on_failure(self):
+        check50.internal.check_running = True
+        l = []
+        check50.internal.register.after_check(lambda : l.append("foo"))
+        check50.internal.register.after_check(lambda : l.append("bar"), on_failure=True)
+
+        def fail():
+            l.append("baz")
+            raise check50.Failure("baz")
+        check50.internal.register.after_check(fail, on_failure=True)
+
+        with self.assertRaises(check50.Failure) as context:
+            with check50.internal.register:
+                raise check50.Failure("qux")
+        self.assertEqual(context.exception.payload["rationale"], "qux")
+        self.assertEqual(l, ["baz", "bar"])
+
+        # Discarded either way
+        with check50.internal.register:
+            pass
+        self.assertEqual(l, ["baz", "bar"])
+        check50.internal.check_running = False
+
 class TestRegisterAfterEvery(unittest.TestCase):
     def test_after_every(self):
         l = []
@@ -1,7 +1,12 @@
 import check50
 import check50.runner
+import check50._cache
+import check50._exceptions
+import check50._timings
+import check50._workspace
 
 import importlib
+import lib50
 import multiprocessing
 import os
 import pathlib
@@ -9,17 +14,17 @@ import pexpect
 import sys
 import tempfile
 import unittest
+import unittest.mock
 
 
 CHECKS_DIRECTORY = pathlib.Path(__file__).absolute().parent / "checks"
-CHECK50_SUPPORTED_START_METHODS = ("fork", "spawn")
+CHECK50_SUPPORTED_START_METHODS = ("fork", "spawn", "forkserver")
 
 
 # Just test spawn under OS X due to a bug with "fork": https://bugs.python.org/issue33725
 if sys.platform == "darwin":
     SUPPORTED_START_METHODS = ("spawn",)
 
-# Don't test forkserver under linux, serves no usecase for check50
 else:
     SUPPORTED_START_METHODS = tuple(set(CHECK50_SUPPORTED_START_METHODS) & set(multiprocessing.get_all_start_methods()))
 
@@ -66,5 +71,215 @@ class TestMultiprocessingStartMethods(unittest.TestCase):
             p.join()
 
 
+class TestCriticalPaths(unittest.TestCase):
+    def setUp(self):
+        self.runner = check50.runner.CheckRunner(None, [])
+        self.graph = {None: {"exists", "style"}, "exists": {"compiles"}, "compiles": {"foo", "bar"}, "bar": {"baz"}}
+
+    def test_unweighted(self):
+        lengths = self.runner.critical_paths(self.graph)
+        self.assertEqual(lengths, {"exists": 4, "style": 1, "compiles": 3, "foo": 1, "bar": 2, "baz": 1})
+
+    def test_weighted(self):
+        lengths = self.runner.critical_paths(self.graph, durations={"style": 10, "foo": 5})
+        self.assertEqual(lengths["style"], 10)
+        self.assertEqual(lengths["compiles"], 6)
+        self.assertEqual(lengths["exists"], 7)
+
+
+class TestMaxWorkers(unittest.TestCase):
+    def test_workers(self):
+        with unittest.mock.patch.dict(os.environ, {"CHECK50_WORKERS": "3"}):
+            self.assertEqual(check50.runner._max_workers(), 3)
+
+        with unittest.mock.patch.dict(os.environ):
+            os.environ.pop("CHECK50_WORKERS", None)
+            self.assertEqual(check50.runner._max_workers(), os.cpu_count() or 1)
+
+    def test_invalid_workers(self):
+        for workers in ("0", "-2", "many"):
+            with unittest.mock.patch.dict(os.environ, {"CHECK50_WORKERS": workers}):
+                with self.assertRaises(check50._exceptions.Error):
+                    check50.runner._max_workers()
+
+
+class TestTimings(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.TemporaryDirectory()
+        os.chdir(self.working_directory.name)
+
+        self._local_path = lib50.get_local_path()
+        lib50.set_local_path("local")
+
+        os.mkdir("checks")
+        with open("checks/__init__.py", "w") as f:
+            f.write("import check50")
+
+    def tearDown(self):
+        lib50.set_local_path(self._local_path)
+        self.working_directory.cleanup()
+
+    def result(self, name, time):
+        return check50.runner.CheckResult(name=name, description=name, time=time)
+
+    def test_no_history(self):
+        timings = check50._timings.Timings("foo/bar", "checks")
+        self.assertEqual(timings.expected(), {})
+
+    def test_history(self):
+        timings = check50._timings.Timings("foo/bar", "checks")
+        timings.record([self.result("foo", 1.0), self.result("bar", None)])
+        timings.save()
+
+        timings = check50._timings.Timings("foo/bar", "checks")
+        timings.record([self.result("foo", 3.0), self.result("foo", 4.0)])
+        self.assertEqual(timings.expected(), {"foo": 3.0})
+
+        self.assertEqual(check50._timings.Timings("foo/baz", "checks").expected(), {})
+
+    def test_history_size(self):
+        timings = check50._timings.Timings("foo/bar", "checks")
+        timings.record([self.result("foo", float(i)) for i in range(check50._timings.HISTORY_SIZE + 5)])
+        self.assertEqual(len(timings.history["foo"]), check50._timings.HISTORY_SIZE)
+
+    def test_unwritable(self):
+        timings = check50._timings.Timings("foo/bar", "checks")
+        timings.record([self.result("foo", 1.0)])
+
+        # A file in the way of the local path
+        with open("local", "w"):
+            pass
+        timings.save()
+
+    def test_fingerprint(self):
+        fingerprint = check50._timings.fingerprint("checks")
+        os.mkdir("checks/__pycache__")
+        self.assertEqual(check50._timings.fingerprint("checks"), fingerprint)
+
+        with open("checks/__init__.py", "a") as f:
+            f.write("\n")
+        self.assertNotEqual(check50._timings.fingerprint("checks"), fingerprint)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.TemporaryDirectory()
+        os.chdir(self.working_directory.name)
+
+        self._local_path = lib50.get_local_path()
+        lib50.set_local_path("local")
+
+        os.mkdir("checks")
+        os.mkdir("submission")
+        os.mkdir("run_dir")
+        with open("submission/foo.py", "w") as f:
+            f.write("foo")
+        with open("run_dir/bar", "w") as f:
+            f.write("bar")
+
+        self.cache = check50._cache.ResultCache("checks")
+        self.result = check50.runner.CheckResult(name="foo", description="foo", passed=True)
+
+    def tearDown(self):
+        lib50.set_local_path(self._local_path)
+        self.working_directory.cleanup()
+
+    def test_keys(self):
+        submission_key = self.cache.submission_key("submission")
+        self.assertEqual(submission_key, self.cache.submission_key("submission"))
+        self.assertNotEqual(self.cache.key("foo", submission_key), self.cache.key("bar", submission_key))
+
+        with open("submission/foo.py", "w") as f:
+            f.write("bar")
+        self.assertNotEqual(self.cache.submission_key("submission"), submission_key)
+
+    def test_imported_dirs(self):
+        os.mkdir("less")
+        submission_key = self.cache.submission_key("submission")
+
+        with unittest.mock.patch("check50.internal.imported_dirs", {pathlib.Path("less").resolve()}):
+            imported_key = self.cache.submission_key("submission")
+            self.assertNotEqual(imported_key, submission_key)
+
+            with open("less/__init__.py", "w") as f:
+                f.write("import check50\n")
+            # As in the next run of check50
+            cache = check50._cache.ResultCache("checks")
+            self.assertNotEqual(cache.submission_key("submission"), imported_key)
+
+    def test_store_and_load(self):
+        key = self.cache.key("foo", self.cache.submission_key("submission"))
+        self.assertIsNone(self.cache.load(key, "restored"))
+
+        self.cache.store(key, self.result, {"baz": 1}, "run_dir")
+        result, state = self.cache.load(key, "restored")
+
+        self.assertEqual(result, self.result)
+        self.assertEqual(state, {"baz": 1})
+        with open("restored/bar") as f:
+            self.assertEqual(f.read(), "bar")
+
+    def test_evicted_while_loading(self):
+        key = self.cache.key("foo", self.cache.submission_key("submission"))
+        self.cache.store(key, self.result, None, "run_dir")
+
+        # As if another process removed the entry right after its result was read
+        with unittest.mock.patch("check50._workspace.clone_tree", side_effect=FileNotFoundError):
+            self.assertIsNone(self.cache.load(key, "restored"))
+        self.assertFalse(os.path.exists("restored"))
+
+    def test_evict(self):
+        self.cache.max_size = 0
+        key = self.cache.key("foo", self.cache.submission_key("submission"))
+        self.cache.store(key, self.result, None, "run_dir")
+        self.cache.evict()
+        self.assertIsNone(self.cache.load(key, "restored"))
+
+
+class TestWorkspace(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.TemporaryDirectory()
+        os.chdir(self.working_directory.name)
+
+        os.mkdir("src")
+        os.mkdir("src/bar")
+        with open("src/foo", "w") as f:
+            f.write("foo")
+        with open("src/bar/baz", "w") as f:
+            f.write("baz")
+        os.chmod("src/foo", 0o755)
+
+    def tearDown(self):
+        self.working_directory.cleanup()
+
+    def test_clone_tree(self):
+        check50._workspace.clone_tree("src", "dst")
+
+        with open("dst/foo") as f:
+            self.assertEqual(f.read(), "foo")
+        with open("dst/bar/baz") as f:
+            self.assertEqual(f.read(), "baz")
+        self.assertEqual(os.stat("dst/foo").st_mode, os.stat("src/foo").st_mode)
+
+    def test_writes_do_not_propagate(self):
+        check50._workspace.clone_tree("src", "dst")
+
+        with open("dst/foo", "w") as f:
+            f.write("bar")
+        os.remove("dst/bar/baz")
+
+        with open("src/foo") as f:
+            self.assertEqual(f.read(), "foo")
+        self.assertTrue(os.path.exists("src/bar/baz"))
+
+    def test_special_files(self):
+        # Opening a FIFO for reading would block until something writes to it
+        os.mkfifo("src/fifo")
+        check50._workspace.clone_tree("src", "dst")
+
+        self.assertFalse(os.path.exists("dst/fifo"))
+        self.assertTrue(os.path.exists("dst/foo"))
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file